@@ -6,16 +6,33 @@ Flask + Google Sheets + Zebra ZPL
 """
 
 import os
+import hashlib
+import hmac
 import json
+import marshal
+import queue
+import re
+import select
 import socket
+import sqlite3
+import threading
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import wraps
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 
 import gspread
+from google.auth.exceptions import TransportError
 from google.oauth2.service_account import Credentials
 
+from calcul_epaisseurs import CalculEpaisseurs, EPAISSEURS_CIBLES, HUMIDITE_CIBLE, HUMIDITES_SECHOIR
+from essences_data import ESSENCES
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -34,443 +51,9 @@ gs_client = None
 spreadsheet = None
 
 # ============================================================================
-# DONNÉES DE RÉFÉRENCE - ESSENCES (BASE TECHNIQUE COMPLÈTE)
+# DONNÉES DE RÉFÉRENCE
 # ============================================================================
-# Sources: CIRAD, Wood Handbook, FCBA, CTBA, Wood Database
-#
-# IDENTIFICATION:
-#   code, nom, nom_latin, nom_en, nom_de
-#
-# DENSITÉS:
-#   densite_frais (kg/m³), densite_sec (kg/m³)
-#
-# RETRAIT (PSF → 0%):
-#   psf = Point de Saturation des Fibres (%)
-#   retrait_t = Retrait tangentiel (%)
-#   retrait_r = Retrait radial (%)
-#   ratio_t_r = Rapport T/R (>2 = bois nerveux)
-#
-# SÉCHAGE:
-#   temp_max = Température max séchoir (°C)
-#   risque_fentes = Sensibilité aux fentes (1=faible, 5=élevé)
-#   risque_collapse = Sensibilité au collapse (1=faible, 5=élevé)
-#   duree_27mm = Durée séchage indicative pour 27mm (jours)
-#
-# USINAGE:
-#   durete = Dureté Monnin (N/mm²)
-#   silice = Teneur en silice (%)
-#   fil = Type de fil (droit, ondulé, contrefil, spiralé, irrégulier)
-#   grain = Grosseur du grain (très fin, fin, moyen, grossier)
-#
-# DURABILITÉ:
-#   durabilite = Classe durabilité naturelle (1=très durable, 5=non durable)
-#   impregnabilite = Classe imprégnabilité (1=facile, 4=non imprégnable)
-#   aubier = Distinction aubier/duramen (distinct, peu distinct, non distinct)
-#
-# ASPECT:
-#   couleur = Description couleur
-#   couleur_hex = Code couleur hexadécimal
-
-ESSENCES_DATA = [
-    # ==================== FEUILLUS - BOIS NERVEUX ====================
-    {
-        "code": "HET", "nom": "Hêtre", "nom_latin": "Fagus sylvatica",
-        "nom_en": "European Beech", "nom_de": "Rotbuche",
-        "densite_frais": 950, "densite_sec": 720,
-        "psf": 32, "retrait_t": 11.8, "retrait_r": 5.8, "ratio_t_r": 2.0,
-        "temp_max": 65, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 35,
-        "durete": 34, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 1, "aubier": "non distinct",
-        "couleur": "blanc rosé à brun clair", "couleur_hex": "#D4A574"
-    },
-    {
-        "code": "CHA", "nom": "Charme", "nom_latin": "Carpinus betulus",
-        "nom_en": "European Hornbeam", "nom_de": "Hainbuche",
-        "densite_frais": 1000, "densite_sec": 800,
-        "psf": 30, "retrait_t": 11.5, "retrait_r": 6.5, "ratio_t_r": 1.8,
-        "temp_max": 55, "risque_fentes": 4, "risque_collapse": 3, "duree_27mm": 50,
-        "durete": 45, "silice": 0, "fil": "irrégulier", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 3, "aubier": "non distinct",
-        "couleur": "blanc grisâtre", "couleur_hex": "#C8C0B0"
-    },
-    # ==================== FEUILLUS - CHÊNES ====================
-    {
-        "code": "CHE", "nom": "Chêne indigène", "nom_latin": "Quercus",
-        "nom_en": "European Oak", "nom_de": "Eiche",
-        "densite_frais": 1070, "densite_sec": 720,
-        "psf": 29, "retrait_t": 10.0, "retrait_r": 4.5, "ratio_t_r": 2.2,
-        "temp_max": 55, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 60,
-        "durete": 38, "silice": 0, "fil": "droit", "grain": "moyen",
-        "durabilite": 2, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun jaune à brun foncé", "couleur_hex": "#A67C52"
-    },
-    {
-        "code": "CHS", "nom": "Chêne sessile", "nom_latin": "Quercus petraea",
-        "nom_en": "Sessile Oak", "nom_de": "Traubeneiche",
-        "densite_frais": 1070, "densite_sec": 720,
-        "psf": 29, "retrait_t": 9.8, "retrait_r": 4.3, "ratio_t_r": 2.3,
-        "temp_max": 55, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 60,
-        "durete": 38, "silice": 0, "fil": "droit", "grain": "moyen",
-        "durabilite": 2, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun miel", "couleur_hex": "#B8860B"
-    },
-    {
-        "code": "CHP", "nom": "Chêne pédonculé", "nom_latin": "Quercus robur",
-        "nom_en": "Pedunculate Oak", "nom_de": "Stieleiche",
-        "densite_frais": 1070, "densite_sec": 720,
-        "psf": 29, "retrait_t": 10.2, "retrait_r": 4.6, "ratio_t_r": 2.2,
-        "temp_max": 55, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 65,
-        "durete": 38, "silice": 0, "fil": "droit", "grain": "moyen",
-        "durabilite": 2, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun jaune", "couleur_hex": "#A67C52"
-    },
-    {
-        "code": "CHR", "nom": "Chêne rouge", "nom_latin": "Quercus rubra",
-        "nom_en": "Red Oak", "nom_de": "Roteiche",
-        "densite_frais": 1000, "densite_sec": 660,
-        "psf": 27, "retrait_t": 8.6, "retrait_r": 4.0, "ratio_t_r": 2.2,
-        "temp_max": 60, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 45,
-        "durete": 32, "silice": 0, "fil": "droit", "grain": "grossier",
-        "durabilite": 4, "impregnabilite": 2, "aubier": "distinct",
-        "couleur": "brun rosé à rouge", "couleur_hex": "#B5651D"
-    },
-    # ==================== FEUILLUS - FRÊNES ====================
-    {
-        "code": "FRE", "nom": "Frêne", "nom_latin": "Fraxinus",
-        "nom_en": "European Ash", "nom_de": "Esche",
-        "densite_frais": 920, "densite_sec": 690,
-        "psf": 28, "retrait_t": 8.0, "retrait_r": 5.0, "ratio_t_r": 1.6,
-        "temp_max": 70, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 25,
-        "durete": 34, "silice": 0, "fil": "droit", "grain": "grossier",
-        "durabilite": 5, "impregnabilite": 2, "aubier": "non distinct",
-        "couleur": "blanc crème à brun clair", "couleur_hex": "#E8DCC4"
-    },
-    {
-        "code": "FRC", "nom": "Frêne commun", "nom_latin": "Fraxinus excelsior",
-        "nom_en": "Common Ash", "nom_de": "Gemeine Esche",
-        "densite_frais": 920, "densite_sec": 690,
-        "psf": 28, "retrait_t": 8.0, "retrait_r": 5.0, "ratio_t_r": 1.6,
-        "temp_max": 70, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 25,
-        "durete": 34, "silice": 0, "fil": "droit", "grain": "grossier",
-        "durabilite": 5, "impregnabilite": 2, "aubier": "non distinct",
-        "couleur": "blanc crème à brun clair", "couleur_hex": "#E8DCC4"
-    },
-    # ==================== FEUILLUS - DIVERS ====================
-    {
-        "code": "CHT", "nom": "Châtaignier", "nom_latin": "Castanea sativa",
-        "nom_en": "Sweet Chestnut", "nom_de": "Edelkastanie",
-        "densite_frais": 950, "densite_sec": 590,
-        "psf": 30, "retrait_t": 6.5, "retrait_r": 3.5, "ratio_t_r": 1.9,
-        "temp_max": 55, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 40,
-        "durete": 18, "silice": 0, "fil": "droit à spiralé", "grain": "grossier",
-        "durabilite": 2, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun jaune à brun foncé", "couleur_hex": "#8B7355"
-    },
-    {
-        "code": "MER", "nom": "Merisier", "nom_latin": "Prunus avium",
-        "nom_en": "Wild Cherry", "nom_de": "Vogelkirsche",
-        "densite_frais": 900, "densite_sec": 620,
-        "psf": 29, "retrait_t": 7.5, "retrait_r": 3.8, "ratio_t_r": 2.0,
-        "temp_max": 50, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 35,
-        "durete": 30, "silice": 0, "fil": "droit à ondulé", "grain": "fin",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "distinct",
-        "couleur": "brun rosé à rouge doré", "couleur_hex": "#B5651D"
-    },
-    {
-        "code": "NOY", "nom": "Noyer", "nom_latin": "Juglans regia",
-        "nom_en": "European Walnut", "nom_de": "Walnuss",
-        "densite_frais": 900, "densite_sec": 680,
-        "psf": 27, "retrait_t": 7.5, "retrait_r": 5.5, "ratio_t_r": 1.4,
-        "temp_max": 55, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 35,
-        "durete": 28, "silice": 0, "fil": "droit à ondulé", "grain": "moyen",
-        "durabilite": 3, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun gris à brun chocolat", "couleur_hex": "#5C4033"
-    },
-    {
-        "code": "NON", "nom": "Noyer noir", "nom_latin": "Juglans nigra",
-        "nom_en": "Black Walnut", "nom_de": "Schwarznuss",
-        "densite_frais": 900, "densite_sec": 610,
-        "psf": 26, "retrait_t": 7.8, "retrait_r": 5.5, "ratio_t_r": 1.4,
-        "temp_max": 55, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 35,
-        "durete": 26, "silice": 0, "fil": "droit à ondulé", "grain": "moyen",
-        "durabilite": 3, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun chocolat à noir violacé", "couleur_hex": "#3D2314"
-    },
-    {
-        "code": "ROB", "nom": "Robinier", "nom_latin": "Robinia pseudoacacia",
-        "nom_en": "Black Locust", "nom_de": "Robinie",
-        "densite_frais": 950, "densite_sec": 770,
-        "psf": 26, "retrait_t": 5.0, "retrait_r": 3.0, "ratio_t_r": 1.7,
-        "temp_max": 65, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 30,
-        "durete": 46, "silice": 0, "fil": "droit", "grain": "moyen",
-        "durabilite": 1, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "jaune verdâtre à brun doré", "couleur_hex": "#9B8B4E"
-    },
-    # ==================== FEUILLUS - ÉRABLES ====================
-    {
-        "code": "ERP", "nom": "Érable plane", "nom_latin": "Acer platanoides",
-        "nom_en": "Norway Maple", "nom_de": "Spitzahorn",
-        "densite_frais": 900, "densite_sec": 650,
-        "psf": 29, "retrait_t": 8.0, "retrait_r": 3.0, "ratio_t_r": 2.7,
-        "temp_max": 55, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 35,
-        "durete": 30, "silice": 0, "fil": "droit à ondulé", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 3, "aubier": "non distinct",
-        "couleur": "blanc crème à jaunâtre", "couleur_hex": "#F5DEB3"
-    },
-    {
-        "code": "ERC", "nom": "Érable champêtre", "nom_latin": "Acer campestre",
-        "nom_en": "Field Maple", "nom_de": "Feldahorn",
-        "densite_frais": 900, "densite_sec": 650,
-        "psf": 29, "retrait_t": 7.8, "retrait_r": 3.2, "ratio_t_r": 2.4,
-        "temp_max": 55, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 35,
-        "durete": 32, "silice": 0, "fil": "droit à ondulé", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 3, "aubier": "non distinct",
-        "couleur": "blanc crème à rosé", "couleur_hex": "#F5DEB3"
-    },
-    {
-        "code": "ERS", "nom": "Érable sycomore", "nom_latin": "Acer pseudoplatanus",
-        "nom_en": "Sycamore Maple", "nom_de": "Bergahorn",
-        "densite_frais": 900, "densite_sec": 650,
-        "psf": 29, "retrait_t": 8.5, "retrait_r": 3.5, "ratio_t_r": 2.4,
-        "temp_max": 55, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 35,
-        "durete": 32, "silice": 0, "fil": "droit à ondulé", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 3, "aubier": "non distinct",
-        "couleur": "blanc nacré", "couleur_hex": "#FFFAF0"
-    },
-    # ==================== FEUILLUS - BOIS BLANCS ====================
-    {
-        "code": "BOU", "nom": "Bouleau", "nom_latin": "Betula",
-        "nom_en": "Birch", "nom_de": "Birke",
-        "densite_frais": 850, "densite_sec": 650,
-        "psf": 28, "retrait_t": 7.5, "retrait_r": 5.5, "ratio_t_r": 1.4,
-        "temp_max": 60, "risque_fentes": 2, "risque_collapse": 2, "duree_27mm": 25,
-        "durete": 22, "silice": 0, "fil": "droit à ondulé", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 2, "aubier": "non distinct",
-        "couleur": "blanc crème à jaune pâle", "couleur_hex": "#F5F5DC"
-    },
-    {
-        "code": "TRE", "nom": "Tremble", "nom_latin": "Populus tremula",
-        "nom_en": "Aspen", "nom_de": "Zitterpappel",
-        "densite_frais": 800, "densite_sec": 500,
-        "psf": 29, "retrait_t": 8.5, "retrait_r": 3.5, "ratio_t_r": 2.4,
-        "temp_max": 70, "risque_fentes": 2, "risque_collapse": 3, "duree_27mm": 20,
-        "durete": 12, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 1, "aubier": "non distinct",
-        "couleur": "blanc grisâtre", "couleur_hex": "#E8E4D9"
-    },
-    {
-        "code": "PEU", "nom": "Peuplier", "nom_latin": "Populus",
-        "nom_en": "Poplar", "nom_de": "Pappel",
-        "densite_frais": 800, "densite_sec": 450,
-        "psf": 29, "retrait_t": 8.5, "retrait_r": 3.5, "ratio_t_r": 2.4,
-        "temp_max": 75, "risque_fentes": 1, "risque_collapse": 3, "duree_27mm": 15,
-        "durete": 10, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 1, "aubier": "non distinct",
-        "couleur": "blanc crème à gris", "couleur_hex": "#E8E4D9"
-    },
-    {
-        "code": "TIL", "nom": "Tilleul", "nom_latin": "Tilia",
-        "nom_en": "Linden", "nom_de": "Linde",
-        "densite_frais": 800, "densite_sec": 530,
-        "psf": 31, "retrait_t": 9.5, "retrait_r": 5.5, "ratio_t_r": 1.7,
-        "temp_max": 60, "risque_fentes": 2, "risque_collapse": 2, "duree_27mm": 25,
-        "durete": 12, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 1, "aubier": "non distinct",
-        "couleur": "blanc jaunâtre à rosé", "couleur_hex": "#F5E6D3"
-    },
-    {
-        "code": "AUN", "nom": "Aulne glutineux", "nom_latin": "Alnus glutinosa",
-        "nom_en": "Common Alder", "nom_de": "Schwarzerle",
-        "densite_frais": 850, "densite_sec": 530,
-        "psf": 29, "retrait_t": 7.3, "retrait_r": 4.0, "ratio_t_r": 1.8,
-        "temp_max": 60, "risque_fentes": 2, "risque_collapse": 2, "duree_27mm": 25,
-        "durete": 15, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 2, "aubier": "non distinct",
-        "couleur": "orange rosé à brun rougeâtre", "couleur_hex": "#CD853F"
-    },
-    # ==================== FEUILLUS - FRUITIERS & SORBUS ====================
-    {
-        "code": "ALT", "nom": "Alisier torminal", "nom_latin": "Sorbus torminalis",
-        "nom_en": "Wild Service Tree", "nom_de": "Elsbeere",
-        "densite_frais": 950, "densite_sec": 750,
-        "psf": 30, "retrait_t": 10.0, "retrait_r": 5.0, "ratio_t_r": 2.0,
-        "temp_max": 50, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 50,
-        "durete": 40, "silice": 0, "fil": "droit", "grain": "très fin",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "peu distinct",
-        "couleur": "brun rosé satiné", "couleur_hex": "#C9A080"
-    },
-    {
-        "code": "ALB", "nom": "Alisier blanc", "nom_latin": "Sorbus aria",
-        "nom_en": "Whitebeam", "nom_de": "Mehlbeere",
-        "densite_frais": 950, "densite_sec": 750,
-        "psf": 30, "retrait_t": 9.5, "retrait_r": 4.8, "ratio_t_r": 2.0,
-        "temp_max": 50, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 50,
-        "durete": 38, "silice": 0, "fil": "droit", "grain": "très fin",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "peu distinct",
-        "couleur": "blanc rosé", "couleur_hex": "#D4A080"
-    },
-    {
-        "code": "COR", "nom": "Cormier", "nom_latin": "Sorbus domestica",
-        "nom_en": "Service Tree", "nom_de": "Speierling",
-        "densite_frais": 950, "densite_sec": 800,
-        "psf": 30, "retrait_t": 10.5, "retrait_r": 5.2, "ratio_t_r": 2.0,
-        "temp_max": 45, "risque_fentes": 5, "risque_collapse": 3, "duree_27mm": 60,
-        "durete": 48, "silice": 0, "fil": "droit", "grain": "très fin",
-        "durabilite": 3, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun rouge à brun foncé", "couleur_hex": "#8B4513"
-    },
-    {
-        "code": "ORM", "nom": "Orme", "nom_latin": "Ulmus",
-        "nom_en": "Elm", "nom_de": "Ulme",
-        "densite_frais": 950, "densite_sec": 680,
-        "psf": 28, "retrait_t": 8.0, "retrait_r": 4.5, "ratio_t_r": 1.8,
-        "temp_max": 55, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 40,
-        "durete": 30, "silice": 0, "fil": "contrefil fréquent", "grain": "grossier",
-        "durabilite": 4, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun clair à brun rougeâtre", "couleur_hex": "#A0826D"
-    },
-    {
-        "code": "PLA", "nom": "Platane", "nom_latin": "Platanus acerifolia",
-        "nom_en": "Plane Tree", "nom_de": "Platane",
-        "densite_frais": 900, "densite_sec": 620,
-        "psf": 28, "retrait_t": 8.5, "retrait_r": 4.5, "ratio_t_r": 1.9,
-        "temp_max": 55, "risque_fentes": 3, "risque_collapse": 2, "duree_27mm": 35,
-        "durete": 28, "silice": 0, "fil": "contrefil", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 2, "aubier": "peu distinct",
-        "couleur": "brun rosé maillé", "couleur_hex": "#C9A080"
-    },
-    {
-        "code": "MAR", "nom": "Marronnier", "nom_latin": "Aesculus hippocastanum",
-        "nom_en": "Horse Chestnut", "nom_de": "Rosskastanie",
-        "densite_frais": 850, "densite_sec": 510,
-        "psf": 30, "retrait_t": 8.0, "retrait_r": 3.0, "ratio_t_r": 2.7,
-        "temp_max": 60, "risque_fentes": 2, "risque_collapse": 2, "duree_27mm": 25,
-        "durete": 14, "silice": 0, "fil": "spiralé", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 1, "aubier": "non distinct",
-        "couleur": "blanc crème à jaunâtre", "couleur_hex": "#F5F5DC"
-    },
-    {
-        "code": "SAU", "nom": "Saule blanc", "nom_latin": "Salix alba",
-        "nom_en": "White Willow", "nom_de": "Silberweide",
-        "densite_frais": 750, "densite_sec": 450,
-        "psf": 28, "retrait_t": 8.5, "retrait_r": 4.0, "ratio_t_r": 2.1,
-        "temp_max": 65, "risque_fentes": 2, "risque_collapse": 3, "duree_27mm": 20,
-        "durete": 10, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 1, "aubier": "non distinct",
-        "couleur": "blanc rosé à grisâtre", "couleur_hex": "#E8DCC4"
-    },
-    {
-        "code": "POI", "nom": "Poirier", "nom_latin": "Pyrus communis",
-        "nom_en": "Pear", "nom_de": "Birnbaum",
-        "densite_frais": 950, "densite_sec": 700,
-        "psf": 28, "retrait_t": 10.0, "retrait_r": 4.5, "ratio_t_r": 2.2,
-        "temp_max": 50, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 45,
-        "durete": 35, "silice": 0, "fil": "droit", "grain": "très fin",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "non distinct",
-        "couleur": "rose saumon à brun rosé", "couleur_hex": "#D4A080"
-    },
-    {
-        "code": "POM", "nom": "Pommier", "nom_latin": "Malus domestica",
-        "nom_en": "Apple", "nom_de": "Apfelbaum",
-        "densite_frais": 950, "densite_sec": 700,
-        "psf": 28, "retrait_t": 10.0, "retrait_r": 4.5, "ratio_t_r": 2.2,
-        "temp_max": 50, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 45,
-        "durete": 35, "silice": 0, "fil": "droit à irrégulier", "grain": "très fin",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "peu distinct",
-        "couleur": "brun rougeâtre", "couleur_hex": "#B07050"
-    },
-    {
-        "code": "PRU", "nom": "Prunier", "nom_latin": "Prunus domestica",
-        "nom_en": "Plum", "nom_de": "Zwetschgenbaum",
-        "densite_frais": 950, "densite_sec": 750,
-        "psf": 28, "retrait_t": 9.0, "retrait_r": 4.0, "ratio_t_r": 2.3,
-        "temp_max": 50, "risque_fentes": 4, "risque_collapse": 2, "duree_27mm": 45,
-        "durete": 38, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "distinct",
-        "couleur": "brun violacé à rouge", "couleur_hex": "#6B3A3A"
-    },
-    {
-        "code": "MIC", "nom": "Micocoulier", "nom_latin": "Celtis australis",
-        "nom_en": "European Hackberry", "nom_de": "Zürgelbaum",
-        "densite_frais": 900, "densite_sec": 650,
-        "psf": 27, "retrait_t": 8.0, "retrait_r": 4.0, "ratio_t_r": 2.0,
-        "temp_max": 60, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 30,
-        "durete": 30, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 4, "impregnabilite": 2, "aubier": "non distinct",
-        "couleur": "jaune grisâtre", "couleur_hex": "#C8B896"
-    },
-    # ==================== RÉSINEUX ====================
-    {
-        "code": "EPC", "nom": "Épicéa commun", "nom_latin": "Picea abies",
-        "nom_en": "Norway Spruce", "nom_de": "Fichte",
-        "densite_frais": 860, "densite_sec": 470,
-        "psf": 30, "retrait_t": 8.0, "retrait_r": 4.0, "ratio_t_r": 2.0,
-        "temp_max": 80, "risque_fentes": 1, "risque_collapse": 1, "duree_27mm": 15,
-        "durete": 12, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 4, "impregnabilite": 4, "aubier": "non distinct",
-        "couleur": "blanc crème à jaune pâle", "couleur_hex": "#F5E6C8"
-    },
-    {
-        "code": "DOU", "nom": "Douglas", "nom_latin": "Pseudotsuga menziesii",
-        "nom_en": "Douglas Fir", "nom_de": "Douglasie",
-        "densite_frais": 850, "densite_sec": 530,
-        "psf": 26, "retrait_t": 7.6, "retrait_r": 4.8, "ratio_t_r": 1.6,
-        "temp_max": 75, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 20,
-        "durete": 18, "silice": 0, "fil": "droit", "grain": "moyen",
-        "durabilite": 3, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun rosé à rouge orangé", "couleur_hex": "#C98B6A"
-    },
-    {
-        "code": "MEE", "nom": "Mélèze d'Europe", "nom_latin": "Larix decidua",
-        "nom_en": "European Larch", "nom_de": "Europäische Lärche",
-        "densite_frais": 900, "densite_sec": 590,
-        "psf": 28, "retrait_t": 7.8, "retrait_r": 3.3, "ratio_t_r": 2.4,
-        "temp_max": 70, "risque_fentes": 3, "risque_collapse": 1, "duree_27mm": 30,
-        "durete": 19, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 3, "impregnabilite": 4, "aubier": "distinct",
-        "couleur": "brun rouge veiné", "couleur_hex": "#A0522D"
-    },
-    {
-        "code": "PIS", "nom": "Pin sylvestre", "nom_latin": "Pinus sylvestris",
-        "nom_en": "Scots Pine", "nom_de": "Waldkiefer",
-        "densite_frais": 850, "densite_sec": 520,
-        "psf": 28, "retrait_t": 7.5, "retrait_r": 4.0, "ratio_t_r": 1.9,
-        "temp_max": 75, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 20,
-        "durete": 16, "silice": 0, "fil": "droit", "grain": "moyen",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "distinct",
-        "couleur": "jaune rougeâtre", "couleur_hex": "#D4A460"
-    },
-    {
-        "code": "PIM", "nom": "Pin maritime", "nom_latin": "Pinus pinaster",
-        "nom_en": "Maritime Pine", "nom_de": "Seekiefer",
-        "densite_frais": 900, "densite_sec": 530,
-        "psf": 29, "retrait_t": 8.0, "retrait_r": 4.5, "ratio_t_r": 1.8,
-        "temp_max": 75, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 20,
-        "durete": 15, "silice": 0, "fil": "droit", "grain": "grossier",
-        "durabilite": 4, "impregnabilite": 2, "aubier": "distinct",
-        "couleur": "jaune à brun rosé", "couleur_hex": "#D4A460"
-    },
-    {
-        "code": "PIN", "nom": "Pin noir", "nom_latin": "Pinus nigra",
-        "nom_en": "Black Pine", "nom_de": "Schwarzkiefer",
-        "densite_frais": 900, "densite_sec": 550,
-        "psf": 28, "retrait_t": 7.5, "retrait_r": 4.0, "ratio_t_r": 1.9,
-        "temp_max": 75, "risque_fentes": 2, "risque_collapse": 1, "duree_27mm": 20,
-        "durete": 17, "silice": 0, "fil": "droit", "grain": "moyen",
-        "durabilite": 4, "impregnabilite": 3, "aubier": "distinct",
-        "couleur": "jaune orangé", "couleur_hex": "#D4A460"
-    },
-    {
-        "code": "SAP", "nom": "Sapin pectiné", "nom_latin": "Abies alba",
-        "nom_en": "Silver Fir", "nom_de": "Weißtanne",
-        "densite_frais": 850, "densite_sec": 450,
-        "psf": 30, "retrait_t": 7.5, "retrait_r": 3.8, "ratio_t_r": 2.0,
-        "temp_max": 80, "risque_fentes": 1, "risque_collapse": 1, "duree_27mm": 15,
-        "durete": 11, "silice": 0, "fil": "droit", "grain": "fin",
-        "durabilite": 5, "impregnabilite": 3, "aubier": "non distinct",
-        "couleur": "blanc crème à jaune pâle", "couleur_hex": "#F5E6C8"
-    },
-]
+# Essences : registre unique ESSENCES, voir essences_data.py
 
 PRODUITS_DATA = [
     {"code": "GRU", "nom": "Grumes"},
@@ -483,48 +66,30 @@ PRODUITS_DATA = [
 # ============================================================================
 # CALCUL AUTOMATIQUE DES ÉPAISSEURS
 # ============================================================================
-# Siccité cible: 8% (standard min 8%, max 10%)
-# Formule: retrait_effectif = retrait_t × (PSF - H_cible) / PSF
-#          ep_frais = ep_sec / (1 - retrait_effectif)
-
-HUMIDITE_CIBLE = 8  # %
-EPAISSEURS_CIBLES = [18, 27, 32, 45, 50, 80]  # mm sec
-
-
-def _calculer_epaisseurs():
-    """Calcule les épaisseurs frais pour chaque essence et épaisseur sèche cible"""
-    result = []
-    for ess in ESSENCES_DATA:
-        code = ess["code"]
-        psf = ess["psf"]
-        retrait_t = ess["retrait_t"]
-        retrait_eff = (retrait_t / 100) * (psf - HUMIDITE_CIBLE) / psf
-        for ep_sec in EPAISSEURS_CIBLES:
-            ep_frais = round(ep_sec / (1 - retrait_eff))
-            result.append({"essence": code, "ep_frais": ep_frais, "ep_sec": ep_sec})
-    return result
+# Siccité cible: 8% (standard min 8%, max 10%), voir calcul_epaisseurs.py
 
+calcul_epaisseurs = CalculEpaisseurs(ESSENCES)
 
-EPAISSEURS_DATA = _calculer_epaisseurs()
+EPAISSEURS_DATA = calcul_epaisseurs.reference()
 
 
 def _afficher_tableau_epaisseurs():
     """Affiche le tableau des épaisseurs au démarrage"""
     print("\n" + "=" * 90)
-    print("  📐 TABLEAU DES ÉPAISSEURS (frais → sec à 8%)")
+    print(f"  📐 TABLEAU DES ÉPAISSEURS (frais → sec à {HUMIDITE_CIBLE}%)")
     print("=" * 90)
     print(f"{'Essence':<8} {'PSF':>4} {'Ret.T':>6} {'T/R':>5} │ " + " │ ".join(f"{e:>2}mm" for e in EPAISSEURS_CIBLES))
     print("-" * 90)
-    for ess in ESSENCES_DATA:
+    grille = calcul_epaisseurs.grille((HUMIDITE_CIBLE,), EPAISSEURS_CIBLES)['tangentiel']
+    for i, ess in enumerate(ESSENCES):
         code = ess["code"]
         psf = ess["psf"]
         rt = ess["retrait_t"]
         tr = ess.get("ratio_t_r", rt / ess.get("retrait_r", 5))
-        eps = [e for e in EPAISSEURS_DATA if e["essence"] == code]
-        vals = " │ ".join(f"{e['ep_frais']:>4}" for e in eps)
+        vals = " │ ".join(f"{ep:>4}" for ep in grille[i, 0])
         print(f"{code:<8} {psf:>3}% {rt:>5.1f}% {tr:>4.1f} │ {vals}")
     print("=" * 90)
-    print(f"  {len(ESSENCES_DATA)} essences × {len(EPAISSEURS_CIBLES)} épaisseurs = {len(EPAISSEURS_DATA)} combinaisons")
+    print(f"  {len(ESSENCES)} essences × {len(EPAISSEURS_CIBLES)} épaisseurs = {len(EPAISSEURS_DATA)} combinaisons")
     print()
 
 
@@ -534,7 +99,7 @@ def _afficher_tableau_epaisseurs():
 
 DEFAULT_CONFIG = {
     'printers': [
-        {'id': 'zebra1', 'nom': 'Zebra Principale', 'ip': '192.168.1.67', 'port': 9100}
+        {'id': 'zebra1', 'nom': 'Zebra Principale', 'ip': '192.168.1.67', 'port': 9100, 'pq': True}
     ],
     'postes': [
         {
@@ -694,149 +259,1184 @@ def admin_required(f):
 # GOOGLE SHEETS
 # ============================================================================
 
-def init_google_sheets():
+def init_google_sheets() -> bool:
+    """Connexion au classeur ; retourne True si Sheets est joignable"""
     global gs_client, spreadsheet
     try:
         if CREDENTIALS_FILE.exists():
             creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
-            gs_client = gspread.authorize(creds)
-            spreadsheet = gs_client.open_by_key(SPREADSHEET_ID)
+            client = gspread.authorize(creds)
+            sheet = client.open_by_key(SPREADSHEET_ID)
+            gs_client, spreadsheet = client, sheet
+            refresh_worksheets()
             print("✓ Google Sheets connecté")
             init_users_sheet()
-        else:
-            print("⚠ credentials.json non trouvé")
+            return True
+        print("⚠ credentials.json non trouvé")
     except Exception as e:
         print(f"⚠ Erreur Google Sheets: {e}")
+    return False
+
+
+# Registre des onglets : tous les handles sont chargés en un seul appel de
+# métadonnées (spreadsheet.worksheets()) et partagés par les helpers, au lieu
+# d'un spreadsheet.worksheet(name) réseau à chaque opération. Le registre est
+# rechargé périodiquement, et quand un onglet demandé est absent (créé à la
+# main dans Google Sheets) — au plus une fois par WORKSHEET_MISS_REFRESH.
+# Un handle périmé (onglet renommé ou supprimé puis recréé) fait échouer ses
+# opérations : le registre est alors rechargé et l'opération rejouée une fois.
+
+WORKSHEET_REFRESH_INTERVAL = 600  # secondes
+WORKSHEET_MISS_REFRESH = 30  # secondes
+
+_worksheets = {}  # titre -> gspread.Worksheet
+_worksheets_loaded_at = 0.0
+_worksheets_lock = threading.Lock()
+
+
+def refresh_worksheets():
+    global _worksheets, _worksheets_loaded_at
+    sheets = spreadsheet.worksheets()
+    with _worksheets_lock:
+        _worksheets = {ws.title: ws for ws in sheets}
+        _worksheets_loaded_at = time.monotonic()
+
+
+def is_stale_handle_error(e: Exception) -> bool:
+    """Erreur d'un handle qui ne correspond plus à un onglet (titre ou id inconnu de Sheets)"""
+    if not isinstance(e, gspread.exceptions.APIError):
+        return False
+    code = getattr(e, 'code', 0) or 0
+    message = str(e).lower()
+    return code == 404 or (code == 400 and ('unable to parse range' in message or 'no grid with id' in message))
+
+
+class WorksheetHandle:
+    """Handle du registre : une opération qui échoue sur un onglet renommé ou supprimé
+    recharge le registre et est rejouée une fois sur le handle à jour"""
+
+    def __init__(self, name: str, ws):
+        self._name = name
+        self._ws = ws
+
+    def __getattr__(self, attr):
+        value = getattr(self._ws, attr)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(self._ws, attr)(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if not is_stale_handle_error(e):
+                    raise
+                print(f"Erreur onglet {self._name} (handle périmé), rechargement du registre: {e}")
+                refresh_worksheets()
+                ws = _worksheets.get(self._name)
+                if ws is None:
+                    raise gspread.WorksheetNotFound(self._name) from e
+                self._ws = ws
+                return getattr(ws, attr)(*args, **kwargs)
+        return call
+
+
+def get_worksheet(name: str):
+    """Handle d'onglet depuis le registre ; lève gspread.WorksheetNotFound s'il n'existe pas"""
+    age = time.monotonic() - _worksheets_loaded_at
+    if age > WORKSHEET_REFRESH_INTERVAL or (name not in _worksheets and age > WORKSHEET_MISS_REFRESH):
+        try:
+            refresh_worksheets()
+        except Exception as e:
+            # Sheets injoignable : le handle connu reste utilisable
+            if name not in _worksheets:
+                raise
+            print(f"Erreur registre onglets: {e}")
+    ws = _worksheets.get(name)
+    if ws is None:
+        raise gspread.WorksheetNotFound(name)
+    return WorksheetHandle(name, ws)
+
+
+def add_worksheet(title: str, rows: int, cols: int):
+    ws = spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+    with _worksheets_lock:
+        _worksheets[title] = ws
+    return ws
+
+
+def worksheets_status() -> dict:
+    return {'onglets': sorted(_worksheets), 'age': round(time.monotonic() - _worksheets_loaded_at, 1) if _worksheets_loaded_at else None}
+
+
+# Index clé (colonne A : ID ou Identifiant) -> numéro de ligne, par onglet.
+# Construit avec un seul col_values(1) au lieu d'un get_all_records() complet,
+# gardé ROW_INDEX_TTL secondes et invalidé après une suppression (les lignes
+# se décalent) ou quand la synchro du miroir voit l'onglet changer. Une clé
+# absente (ligne ajoutée depuis) force une reconstruction, et une ligne venant
+# d'un index en cache est vérifiée (un acell) avant usage : des lignes
+# supprimées ou triées directement dans Google Sheets l'ont peut-être décalée.
+
+ROW_INDEX_TTL = 300
+
+_row_indexes = {}  # titre d'onglet -> (expiration monotonic, {clé: ligne})
+
+
+def find_row(sheet, key: str, normalize=str):
+    entry = _row_indexes.get(sheet.title)
+    if entry is not None and entry[0] >= time.monotonic() and key in entry[1]:
+        row_num = entry[1][key]
+        if normalize(str(sheet.acell(f"A{row_num}").value or '').strip()) == key:
+            return row_num
+    index = {}
+    for i, value in enumerate(sheet.col_values(1)[1:], start=2):
+        if value != '':
+            index.setdefault(normalize(str(value).strip()), i)  # premier doublon, comme l'ancien parcours
+    _row_indexes[sheet.title] = (time.monotonic() + ROW_INDEX_TTL, index)
+    return index.get(key)
+
+
+def invalidate_row_index(title: str):
+    _row_indexes.pop(title, None)
+
+
+def update_row_range(sheet, row_num: int, first_col: int, values: list, mirror: bool = True):
+    """Écrit des cellules consécutives d'une ligne en un seul appel (USER_ENTERED, comme update_cell)"""
+    start = gspread.utils.rowcol_to_a1(row_num, first_col)
+    end = gspread.utils.rowcol_to_a1(row_num, first_col + len(values) - 1)
+    sheet.update(range_name=f"{start}:{end}", values=[values], value_input_option='USER_ENTERED')
+    if mirror:
+        mirror_update(sheet.title, row_num, first_col, values)
+
+
+def delete_row(sheet, row_num: int, mirror: bool = True):
+    sheet.delete_rows(row_num)
+    invalidate_row_index(sheet.title)
+    if mirror:
+        mirror_delete(sheet.title, row_num)
 
 
 def init_users_sheet():
     try:
-        sheet = spreadsheet.worksheet('Utilisateurs')
+        sheet = get_worksheet('Utilisateurs')
         if len(sheet.get_all_values()) <= 1:
             sheet.append_row(['admin', '123456', 'Administrateur', 'AD', 'admin', ''])
             sheet.append_row(['operateur', '111111', 'Opérateur', 'OP', 'operateur', ''])
     except gspread.WorksheetNotFound:
-        sheet = spreadsheet.add_worksheet(title='Utilisateurs', rows=100, cols=10)
+        sheet = add_worksheet(title='Utilisateurs', rows=100, cols=10)
         sheet.append_row(['Identifiant', 'Mot de passe', 'Nom', 'Initiales', 'Droits', 'Postes'])
         sheet.append_row(['admin', '123456', 'Administrateur', 'AD', 'admin', ''])
         sheet.append_row(['operateur', '111111', 'Opérateur', 'OP', 'operateur', ''])
         print("  → Onglet Utilisateurs créé")
 
 
-def init_reference_tables():
-    """Synchronise les tables de référence (ajoute les entrées manquantes en batch)"""
-    if spreadsheet is None:
-        return
-    
-    config = load_config()
-    
-    # Essences
-    table_cfg = next((t for t in config.get('tables', []) if t['id'] == 'essences'), None)
-    if table_cfg:
-        sheet = get_or_create_table_sheet('essences', table_cfg)
-        if sheet:
-            existing = sheet.get_all_records()
-            existing_codes = {str(e.get('Code', '')).upper() for e in existing}
-            colonnes = table_cfg.get('colonnes', [])
-            rows_to_add = []
-            next_id = len(existing) + 1
-            for item in ESSENCES_DATA:
-                if item['code'].upper() not in existing_codes:
-                    rows_to_add.append([next_id] + [item.get(col['id'], '') for col in colonnes])
-                    next_id += 1
-            if rows_to_add:
-                sheet.append_rows(rows_to_add)
-                print(f"  → Essences: {len(rows_to_add)} ajoutée(s)")
-    
-    # Produits
-    table_cfg = next((t for t in config.get('tables', []) if t['id'] == 'produits'), None)
-    if table_cfg:
-        sheet = get_or_create_table_sheet('produits', table_cfg)
-        if sheet:
-            existing = sheet.get_all_records()
-            existing_codes = {str(e.get('Code', '')).upper() for e in existing}
-            colonnes = table_cfg.get('colonnes', [])
-            rows_to_add = []
-            next_id = len(existing) + 1
-            for item in PRODUITS_DATA:
-                if item['code'].upper() not in existing_codes:
-                    rows_to_add.append([next_id] + [item.get(col['id'], '') for col in colonnes])
-                    next_id += 1
-            if rows_to_add:
-                sheet.append_rows(rows_to_add)
-                print(f"  → Produits: {len(rows_to_add)} ajouté(s)")
-    
-    # Épaisseurs
-    table_cfg = next((t for t in config.get('tables', []) if t['id'] == 'epaisseurs'), None)
-    if table_cfg:
-        sheet = get_or_create_table_sheet('epaisseurs', table_cfg)
-        if sheet:
-            existing = sheet.get_all_records()
-            existing_keys = {
-                (str(e.get('Essence', '')).upper(), int(e.get('Ép. sec (mm)', 0) or 0))
-                for e in existing
-            }
-            colonnes = table_cfg.get('colonnes', [])
-            rows_to_add = []
-            next_id = len(existing) + 1
-            for item in EPAISSEURS_DATA:
-                key = (item['essence'].upper(), item['ep_sec'])
-                if key not in existing_keys:
-                    rows_to_add.append([next_id] + [item.get(col['id'], '') for col in colonnes])
-                    next_id += 1
-            if rows_to_add:
-                sheet.append_rows(rows_to_add)
-                print(f"  → Épaisseurs: {len(rows_to_add)} ajoutée(s)")
-
-
-def get_or_create_poste_sheet(poste_id: str, poste_config: dict):
+def poste_headers(poste_config: dict) -> list:
+    headers = ['Date', 'Heure', 'Série', 'Numéro']
+    if poste_config.get('type_produit'):
+        headers.extend(['Essence', 'Qualité', 'Épaisseur'])
+    if poste_config.get('source_poste'):
+        headers.append('Source')
+    for field in poste_config.get('champs', []):
+        headers.append(field['nom'])
+    headers.extend(['Copies', 'Opérateur'])
+    return headers
+
+
+def poste_row(poste_config: dict, data: dict, copies: int, operateur: str, now: datetime = None) -> list:
+    now = now or datetime.now()
+    row = [now.strftime('%d/%m/%Y'), now.strftime('%H:%M:%S'), poste_config.get('serie', '2501'), data.get('numero', '')]
+    if poste_config.get('type_produit'):
+        row.extend([data.get('essence', ''), data.get('qualite', ''), data.get('epaisseur', '')])
+    if poste_config.get('source_poste'):
+        row.append(data.get('source', ''))
+    for field in poste_config.get('champs', []):
+        row.append(data.get(field['id'], ''))
+    row.extend([copies, operateur])
+    return row
+
+
+def get_or_create_poste_sheet(poste_id: str, poste_config: dict = None, headers: list = None):
     sheet_name = f"Poste_{poste_id}"
     try:
-        return spreadsheet.worksheet(sheet_name)
+        return get_worksheet(sheet_name)
     except gspread.WorksheetNotFound:
-        sheet = spreadsheet.add_worksheet(title=sheet_name, rows=1000, cols=20)
-        headers = ['Date', 'Heure', 'Série', 'Numéro']
-        if poste_config.get('type_produit'):
-            headers.extend(['Essence', 'Qualité', 'Épaisseur'])
-        if poste_config.get('source_poste'):
-            headers.append('Source')
-        for field in poste_config.get('champs', []):
-            headers.append(field['nom'])
-        headers.extend(['Copies', 'Opérateur'])
+        sheet = add_worksheet(title=sheet_name, rows=1000, cols=20)
+        headers = headers or poste_headers(poste_config or {})
         sheet.append_row(headers)
+        _poste_sheet_headers[sheet_name] = headers
+        _poste_sheet_rows[sheet_name] = 1
         return sheet
 
 
 def log_to_poste_sheet(poste_id: str, poste_config: dict, data: dict, copies: int, operateur: str):
-    if spreadsheet is None:
-        return
+    """Enregistre l'impression dans le journal local (écriture synchronisée sur disque).
+    L'envoi vers l'onglet Poste_<id> est fait en arrière-plan par le worker du journal."""
+    log_rows_to_poste_sheet(poste_id, poste_config, [poste_row(poste_config, data, copies, operateur)])
+
+
+def log_rows_to_poste_sheet(poste_id: str, poste_config: dict, rows: list):
+    headers = poste_headers(poste_config)
+    publish_event('impression', {'poste_id': poste_id, 'serie': str(rows[0][2]) if rows else '',
+                                 'numeros': [str(row[3]) for row in rows]})
     try:
-        sheet = get_or_create_poste_sheet(poste_id, poste_config)
-        now = datetime.now()
-        row = [now.strftime('%d/%m/%Y'), now.strftime('%H:%M:%S'), poste_config.get('serie', '2501'), data.get('numero', '')]
-        if poste_config.get('type_produit'):
-            row.extend([data.get('essence', ''), data.get('qualite', ''), data.get('epaisseur', '')])
-        if poste_config.get('source_poste'):
-            row.append(data.get('source', ''))
-        for field in poste_config.get('champs', []):
-            row.append(data.get(field['id'], ''))
-        row.extend([copies, operateur])
-        sheet.append_row(row)
+        journal_append(poste_id, headers, rows)
     except Exception as e:
-        print(f"Erreur log: {e}")
+        # Journal indisponible (disque plein, base verrouillée...) : envoi direct
+        print(f"Erreur journal: {e}")
+        try:
+            if spreadsheet is None:
+                raise ConnectionError('Google Sheets non connecté')
+            get_or_create_poste_sheet(poste_id, poste_config).append_rows(rows)
+        except Exception as e:
+            print(f"Erreur log: {e}")
+            journal_secours(poste_id, headers, rows)
+
+
+# L'historique n'est lu que par la fin : on connaît l'en-tête et le nombre de
+# lignes de chaque onglet Poste_<id>, et on ne télécharge que la plage des
+# `limit` dernières lignes. Le nombre de lignes est compté une fois
+# (col_values(1)) puis tenu à jour par les réponses des append du journal.
+
+_poste_sheet_headers = {}  # titre -> en-têtes
+_poste_sheet_rows = {}  # titre -> numéro de la dernière ligne remplie
+
+
+def appended_range(response):
+    """(première, dernière) ligne écrite d'après la réponse d'un append (updatedRange 'Onglet!A5:J7'), ou None"""
+    try:
+        m = re.search(r'!\D*(\d+)(?::\D*(\d+))?$', response['updates']['updatedRange'])
+        return int(m.group(1)), int(m.group(2) or m.group(1))
+    except (TypeError, KeyError, AttributeError):
+        return None
+
+
+def note_appended_rows(title: str, response):
+    """Met à jour le nombre de lignes connu d'après la réponse d'un append"""
+    rng = appended_range(response)
+    if rng is None:
+        _poste_sheet_rows.pop(title, None)
+        return
+    _poste_sheet_rows[title] = max(_poste_sheet_rows.get(title, 0), rng[1])
 
 
 def get_poste_history(poste_id: str, limit: int = 50) -> list:
+    """Les `limit` dernières lignes de Poste_<id>, les plus récentes d'abord, impressions
+    pas encore envoyées comprises. Servies par le miroir local dès qu'il est chargé."""
+    pending = journal_pending_records(poste_id, limit)
+    records = mirror_tail(f"Poste_{poste_id}", limit)
+    if records is None:
+        records = _poste_history_from_sheet(poste_id, limit)
+    return (pending + records)[:limit]
+
+
+def _poste_history_from_sheet(poste_id: str, limit: int) -> list:
     if spreadsheet is None:
         return []
     try:
-        sheet = spreadsheet.worksheet(f"Poste_{poste_id}")
-        records = sheet.get_all_records()
-        return list(reversed(records[-limit:]))
-    except:
+        sheet = get_worksheet(f"Poste_{poste_id}")
+        headers = _poste_sheet_headers.get(sheet.title)
+        if headers is None:
+            headers = _poste_sheet_headers[sheet.title] = sheet.row_values(1)
+        last = _poste_sheet_rows.get(sheet.title)
+        if last is None:
+            last = _poste_sheet_rows[sheet.title] = len(sheet.col_values(1))
+        if last < 2 or not headers:
+            return []
+        first = max(2, last - limit + 1)
+        rows = sheet.get(f"A{first}:{gspread.utils.rowcol_to_a1(last, len(headers))}")
+        if len(rows) < last - first + 1:
+            # Lignes supprimées à la main : recompter au prochain appel
+            _poste_sheet_rows.pop(sheet.title, None)
+        records = [dict(zip(headers, gspread.utils.numericise_all(row + [''] * (len(headers) - len(row)))))
+                   for row in rows if any(row)]
+        return list(reversed(records))
+    except gspread.WorksheetNotFound:
+        return []  # aucune impression envoyée pour ce poste
+    except Exception as e:
+        print(f"Erreur historique {poste_id}: {e}")
         return []
 
 
+# ============================================================================
+# JOURNAL LOCAL DES IMPRESSIONS
+# ============================================================================
+# Chaque impression est d'abord écrite dans une base SQLite locale (WAL,
+# synchronous=FULL : la ligne est sur disque au retour de l'INSERT), puis un
+# worker en arrière-plan la pousse vers Poste_<id> par lots (append_rows).
+# En cas d'échec, les lignes restent en attente et l'envoi est retenté avec
+# un délai croissant.
+
+LOCAL_DB_FILE = BASE_DIR / 'woodstock.db'
+JOURNAL_SECOURS_FILE = BASE_DIR / 'journal_secours.jsonl'  # si la base elle-même est inutilisable
+JOURNAL_FLUSH_INTERVAL = 30  # secondes entre deux passages sans nouvelle impression
+JOURNAL_COALESCE_DELAY = 1  # secondes d'attente pour regrouper les impressions proches
+JOURNAL_BATCH_MAX = 500
+JOURNAL_RETRY_MAX_DELAY = 300
+JOURNAL_RETENTION_DAYS = 90
+
+_local_db = threading.local()
+_journal_event = threading.Event()
+_journal_state = {'dernier_envoi': None, 'derniere_erreur': None}
+
+
+def get_local_db() -> sqlite3.Connection:
+    """Connexion SQLite propre au thread courant (autocommit)"""
+    conn = getattr(_local_db, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(str(LOCAL_DB_FILE), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        _local_db.conn = conn
+    return conn
+
+
+def init_local_db():
+    db = get_local_db()
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS journal_impressions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            poste_id TEXT NOT NULL,
+            ligne TEXT NOT NULL,
+            entetes TEXT NOT NULL,
+            cree_le REAL NOT NULL,
+            envoye_le REAL,
+            tentatives INTEGER NOT NULL DEFAULT 0,
+            erreur TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_journal_attente
+            ON journal_impressions (id) WHERE envoye_le IS NULL;
+        CREATE TABLE IF NOT EXISTS compteurs (
+            poste_id TEXT PRIMARY KEY,
+            valeur INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS operations_attente (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            onglet TEXT NOT NULL,
+            action TEXT NOT NULL,
+            cle TEXT NOT NULL,
+            valeurs TEXT NOT NULL,
+            colonne INTEGER NOT NULL DEFAULT 1,
+            cree_le REAL NOT NULL,
+            tentatives INTEGER NOT NULL DEFAULT 0,
+            erreur TEXT
+        );
+        CREATE TABLE IF NOT EXISTS miroir_onglets (
+            titre TEXT PRIMARY KEY,
+            entetes TEXT NOT NULL,
+            lignes INTEGER NOT NULL,
+            empreinte TEXT,
+            synchro_le REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS miroir_lignes (
+            titre TEXT NOT NULL,
+            ligne INTEGER NOT NULL,
+            valeurs TEXT NOT NULL,
+            PRIMARY KEY (titre, ligne)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS references_empreintes (
+            table_id TEXT NOT NULL,
+            cle TEXT NOT NULL,
+            empreinte TEXT NOT NULL,
+            PRIMARY KEY (table_id, cle)
+        ) WITHOUT ROWID;
+    """)
+    reprendre_journal_secours()
+
+
+@contextmanager
+def local_db_transaction(db: sqlite3.Connection):
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+def journal_append(poste_id: str, headers: list, rows: list):
+    """Ajoute des lignes au journal en une seule transaction, puis réveille le worker"""
+    db = get_local_db()
+    now = time.time()
+    entetes = json.dumps(headers, ensure_ascii=False)
+    with local_db_transaction(db):
+        db.executemany(
+            'INSERT INTO journal_impressions (poste_id, ligne, entetes, cree_le) VALUES (?, ?, ?, ?)',
+            [(poste_id, json.dumps(row, ensure_ascii=False), entetes, now) for row in rows]
+        )
+    _journal_event.set()
+
+
+def journal_secours(poste_id: str, headers: list, rows: list):
+    """Dernier recours quand ni la base locale ni Sheets ne répondent : une ligne JSON par impression,
+    reprise dans le journal au prochain démarrage"""
+    try:
+        with open(JOURNAL_SECOURS_FILE, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps({'poste_id': poste_id, 'entetes': headers, 'ligne': row}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception as e:
+        print(f"Erreur journal de secours: {e}")
+
+
+def reprendre_journal_secours():
+    if not JOURNAL_SECOURS_FILE.exists():
+        return
+    reprises = 0
+    with open(JOURNAL_SECOURS_FILE, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # ligne tronquée par un arrêt brutal
+            journal_append(entry['poste_id'], entry['entetes'], [entry['ligne']])
+            reprises += 1
+    JOURNAL_SECOURS_FILE.unlink()
+    print(f"  → Journal de secours: {reprises} impression(s) reprise(s)")
+
+
+def _already_in_sheet(sheet, entries: list) -> set:
+    """Ids des lignes déjà présentes en fin d'onglet (même série et numéro) : un envoi précédent a pu
+    aboutir sans que la réponse nous parvienne"""
+    keys = {}
+    for e in entries:
+        ligne = json.loads(e['ligne'])
+        if len(ligne) > 3 and ligne[3] != '':
+            keys.setdefault((str(ligne[2]), str(ligne[3])), []).append(e['id'])
+    if not keys:
+        return set()
+    # Seule la fin de l'onglet est lue : à partir du nombre de lignes connu (réponses des
+    # append, sinon miroir), moins une marge, jusqu'à la dernière ligne
+    last = _poste_sheet_rows.get(sheet.title)
+    if last is None:
+        row = get_local_db().execute('SELECT lignes FROM miroir_onglets WHERE titre = ?', (sheet.title,)).fetchone()
+        last = row['lignes'] if row else None
+    if last is None:
+        last = _poste_sheet_rows[sheet.title] = len(sheet.col_values(1))
+    first = max(2, last - len(entries) - JOURNAL_BATCH_MAX + 1)
+    tail = sheet.get(f"C{first}:D")
+    found = set()
+    for cells in tail:
+        if len(cells) == 2:
+            found.update(keys.pop((cells[0], cells[1]), []))
+    return found
+
+
+def flush_journal() -> bool:
+    """Pousse les lignes en attente vers Google Sheets. Retourne False si un envoi a échoué."""
+    if spreadsheet is None:
+        return False
+    db = get_local_db()
+    pending = db.execute(
+        'SELECT id, poste_id, ligne, entetes, tentatives FROM journal_impressions WHERE envoye_le IS NULL ORDER BY id LIMIT ?',
+        (JOURNAL_BATCH_MAX,)
+    ).fetchall()
+    by_poste = {}
+    for r in pending:
+        by_poste.setdefault(r['poste_id'], []).append(r)
+    ok = True
+    for poste_id, entries in by_poste.items():
+        ids = [(e['id'],) for e in entries]
+        try:
+            sheet = get_or_create_poste_sheet(poste_id, headers=json.loads(entries[0]['entetes']))
+            # Nouvel essai après un échec : pas de doublon (poste, série, numéro)
+            deja = _already_in_sheet(sheet, entries) if any(e['tentatives'] for e in entries) else set()
+            rows = [json.loads(e['ligne']) for e in entries if e['id'] not in deja]
+            response = sheet.append_rows(rows) if rows else None
+            note_appended_rows(sheet.title, response)
+            now = time.time()
+            # Les lignes passent du journal au miroir d'un coup : l'historique ne les perd ni ne les double
+            with local_db_transaction(db):
+                if rows:
+                    mirror_put_appended(db, sheet.title, response, rows)
+                else:
+                    _mirror_event.set()
+                db.executemany('UPDATE journal_impressions SET envoye_le = ?, erreur = NULL WHERE id = ?',
+                               [(now, i) for (i,) in ids])
+            _journal_state['dernier_envoi'] = datetime.now().isoformat(timespec='seconds')
+        except Exception as e:
+            ok = False
+            db.executemany('UPDATE journal_impressions SET tentatives = tentatives + 1, erreur = ? WHERE id = ?',
+                           [(str(e), i) for (i,) in ids])
+            _journal_state['derniere_erreur'] = f"{poste_id}: {e}"
+            print(f"Erreur envoi journal {poste_id}: {e}")
+    if ok and len(pending) == JOURNAL_BATCH_MAX:
+        _journal_event.set()  # il reste des lignes
+    return ok
+
+
+def purge_journal():
+    limite = time.time() - JOURNAL_RETENTION_DAYS * 86400
+    get_local_db().execute('DELETE FROM journal_impressions WHERE envoye_le IS NOT NULL AND envoye_le < ?', (limite,))
+
+
+def journal_pending_records(poste_id: str, limit: int) -> list:
+    """Impressions pas encore envoyées vers Sheets, les plus récentes d'abord"""
+    rows = get_local_db().execute(
+        'SELECT ligne, entetes FROM journal_impressions WHERE poste_id = ? AND envoye_le IS NULL ORDER BY id DESC LIMIT ?',
+        (poste_id, limit)
+    ).fetchall()
+    return [_mirror_record(json.loads(r['entetes']), _mirror_cells(json.loads(r['ligne']))) for r in rows]
+
+
+def journal_status() -> dict:
+    row = get_local_db().execute(
+        'SELECT COUNT(*) AS n, MIN(cree_le) AS plus_ancien FROM journal_impressions WHERE envoye_le IS NULL'
+    ).fetchone()
+    return {
+        'en_attente': row['n'],
+        'plus_ancien': datetime.fromtimestamp(row['plus_ancien']).isoformat(timespec='seconds') if row['plus_ancien'] else None,
+        **_journal_state
+    }
+
+
+def _journal_worker():
+    delay = JOURNAL_FLUSH_INTERVAL
+    last_purge = 0
+    while True:
+        if _journal_event.wait(delay):
+            time.sleep(JOURNAL_COALESCE_DELAY)
+        _journal_event.clear()
+        try:
+            # Les modifications en attente d'abord, dans leur ordre, puis les impressions
+            ok = flush_operations()
+            ok = flush_journal() and ok
+        except Exception as e:
+            print(f"Erreur worker journal: {e}")
+            ok = False
+        # Backoff exponentiel tant que Sheets refuse les envois
+        delay = JOURNAL_FLUSH_INTERVAL if ok else min(delay * 2, JOURNAL_RETRY_MAX_DELAY)
+        if time.time() - last_purge > 86400:
+            purge_journal()
+            last_purge = time.time()
+
+
+# ============================================================================
+# MIROIR LOCAL DES ONGLETS
+# ============================================================================
+# Copie SQLite des onglets Utilisateurs, Table_* et Poste_* : les lectures
+# (tables, utilisateurs, historique) sont servies localement et continuent de
+# fonctionner quand la liaison avec Google est coupée.
+# Un worker tire tous les onglets suivis en un seul values_batch_get : tables
+# et utilisateurs en entier, Poste_* par plages de lignes à partir de la
+# dernière ligne connue. Les écritures de l'appli sont reportées dans le
+# miroir dès que Sheets les a acceptées ; l'envoi des impressions reste fait
+# par le worker du journal.
+
+MIRROR_SYNC_INTERVAL = 60  # secondes
+MIRROR_RETRY_MAX_DELAY = 300
+MIRROR_CHUNK = 2000  # lignes tirées par onglet Poste_* et par passage
+MIRROR_LAST_COL = 'AZ'
+
+_mirror_event = threading.Event()
+_mirror_writes = {}  # titre -> instant (monotonic) de la dernière écriture reportée localement
+_mirror_state = {'en_ligne': None, 'derniere_synchro': None, 'derniere_erreur': None, 'duree_ms': None}
+
+
+def is_mirrored(title: str) -> bool:
+    return title == 'Utilisateurs' or title.startswith(('Table_', 'Poste_'))
+
+
+def _mirror_cells(row: list) -> list:
+    """Valeurs telles que Sheets les renvoie (texte)"""
+    return ['' if v is None else str(v) for v in row]
+
+
+def _mirror_record(headers: list, values: list) -> dict:
+    return dict(zip(headers, gspread.utils.numericise_all(values + [''] * (len(headers) - len(values)))))
+
+
+def mirror_headers(title: str):
+    row = get_local_db().execute('SELECT entetes FROM miroir_onglets WHERE titre = ?', (title,)).fetchone()
+    return json.loads(row['entetes']) if row else None
+
+
+def mirror_records(title: str):
+    """Lignes de l'onglet comme get_all_records(), ou None s'il n'est pas (encore) dans le miroir"""
+    headers = mirror_headers(title)
+    if headers is None:
+        return None
+    rows = get_local_db().execute('SELECT valeurs FROM miroir_lignes WHERE titre = ? ORDER BY ligne', (title,))
+    return [_mirror_record(headers, json.loads(r['valeurs'])) for r in rows]
+
+
+def mirror_values(title: str):
+    """Contenu brut de l'onglet (en-tête compris) comme get_all_values(), ou None"""
+    headers = mirror_headers(title)
+    if headers is None:
+        return None
+    rows = get_local_db().execute('SELECT ligne, valeurs FROM miroir_lignes WHERE titre = ? ORDER BY ligne', (title,))
+    values = [headers]
+    for r in rows:
+        values += [[]] * (r['ligne'] - len(values) - 1)  # lignes vides non stockées
+        values.append(json.loads(r['valeurs']))
+    return values
+
+
+def mirror_tail(title: str, limit: int):
+    """Les `limit` dernières lignes non vides, les plus récentes d'abord (None si absent du miroir)"""
+    headers = mirror_headers(title)
+    if headers is None:
+        return None
+    rows = get_local_db().execute(
+        "SELECT valeurs FROM miroir_lignes WHERE titre = ? AND valeurs != '[]' ORDER BY ligne DESC LIMIT ?",
+        (title, limit)
+    )
+    return [_mirror_record(headers, values) for values in (json.loads(r['valeurs']) for r in rows) if any(values)]
+
+
+def mirror_replace(title: str, values: list) -> bool:
+    """Remplace le contenu de l'onglet (en-tête compris). Retourne True si quelque chose a changé."""
+    data = json.dumps(values, ensure_ascii=False)
+    empreinte = hashlib.sha1(data.encode()).hexdigest()
+    db = get_local_db()
+    with local_db_transaction(db):
+        row = db.execute('SELECT empreinte FROM miroir_onglets WHERE titre = ?', (title,)).fetchone()
+        if row and row['empreinte'] == empreinte:
+            db.execute('UPDATE miroir_onglets SET synchro_le = ? WHERE titre = ?', (time.time(), title))
+            return False
+        db.execute('DELETE FROM miroir_lignes WHERE titre = ?', (title,))
+        db.executemany('INSERT INTO miroir_lignes (titre, ligne, valeurs) VALUES (?, ?, ?)',
+                       [(title, i, json.dumps(v, ensure_ascii=False)) for i, v in enumerate(values[1:], start=2)])
+        db.execute(
+            'INSERT OR REPLACE INTO miroir_onglets (titre, entetes, lignes, empreinte, synchro_le) VALUES (?, ?, ?, ?, ?)',
+            (title, json.dumps(values[0] if values else [], ensure_ascii=False), len(values), empreinte, time.time())
+        )
+    return True
+
+
+def _mirror_put(db: sqlite3.Connection, title: str, first_row: int, rows: list) -> bool:
+    """Écrit des lignes à partir de first_row (dans une transaction ouverte par l'appelant)"""
+    if not db.execute('SELECT 1 FROM miroir_onglets WHERE titre = ?', (title,)).fetchone():
+        return False  # pas encore tiré : le prochain passage le chargera en entier
+    db.executemany('INSERT OR REPLACE INTO miroir_lignes (titre, ligne, valeurs) VALUES (?, ?, ?)',
+                   [(title, first_row + i, json.dumps(_mirror_cells(r), ensure_ascii=False)) for i, r in enumerate(rows)])
+    db.execute('UPDATE miroir_onglets SET lignes = MAX(lignes, ?), empreinte = NULL WHERE titre = ?',
+               (first_row + len(rows) - 1, title))
+    return True
+
+
+def mirror_put_appended(db: sqlite3.Connection, title: str, response, rows: list):
+    """Reporte un append d'après sa réponse (dans une transaction ouverte par l'appelant)"""
+    if not is_mirrored(title):
+        return
+    rng = appended_range(response)
+    if rng is None:
+        _mirror_event.set()  # position inconnue : on resynchronise
+        return
+    _mirror_put(db, title, rng[0], rows)
+    _mirror_writes[title] = time.monotonic()
+
+
+def mirror_appended(title: str, response, rows: list):
+    try:
+        db = get_local_db()
+        with local_db_transaction(db):
+            mirror_put_appended(db, title, response, rows)
+    except Exception as e:
+        print(f"Erreur miroir {title}: {e}")
+        _mirror_event.set()
+
+
+def _mirror_patch(db: sqlite3.Connection, title: str, row_num: int, first_col: int, values: list):
+    row = db.execute('SELECT valeurs FROM miroir_lignes WHERE titre = ? AND ligne = ?', (title, row_num)).fetchone()
+    cells = json.loads(row['valeurs']) if row else []
+    cells += [''] * (first_col - 1 + len(values) - len(cells))
+    cells[first_col - 1:first_col - 1 + len(values)] = _mirror_cells(values)
+    _mirror_put(db, title, row_num, [cells])
+
+
+def _mirror_remove(db: sqlite3.Connection, title: str, row_num: int):
+    db.execute('DELETE FROM miroir_lignes WHERE titre = ? AND ligne = ?', (title, row_num))
+    # Décalage en deux temps pour ne pas heurter la clé primaire
+    db.execute('UPDATE miroir_lignes SET ligne = 1 - ligne WHERE titre = ? AND ligne > ?', (title, row_num))
+    db.execute('UPDATE miroir_lignes SET ligne = -ligne WHERE titre = ? AND ligne < 0', (title,))
+    db.execute('UPDATE miroir_onglets SET lignes = MAX(lignes - 1, 1), empreinte = NULL WHERE titre = ?', (title,))
+
+
+def mirror_find_row(db: sqlite3.Connection, title: str, key: str, normalize=str):
+    """Numéro de ligne de la clé (colonne A) dans le miroir, ou None"""
+    for r in db.execute('SELECT ligne, valeurs FROM miroir_lignes WHERE titre = ?', (title,)):
+        values = json.loads(r['valeurs'])
+        if values and normalize(values[0]) == key:
+            return r['ligne']
+    return None
+
+
+def mirror_update(title: str, row_num: int, first_col: int, values: list):
+    if not is_mirrored(title):
+        return
+    try:
+        db = get_local_db()
+        with local_db_transaction(db):
+            _mirror_patch(db, title, row_num, first_col, values)
+        _mirror_writes[title] = time.monotonic()
+    except Exception as e:
+        print(f"Erreur miroir {title}: {e}")
+        _mirror_event.set()
+
+
+def mirror_delete(title: str, row_num: int):
+    if not is_mirrored(title):
+        return
+    try:
+        db = get_local_db()
+        with local_db_transaction(db):
+            _mirror_remove(db, title, row_num)
+        _mirror_writes[title] = time.monotonic()
+    except Exception as e:
+        print(f"Erreur miroir {title}: {e}")
+        _mirror_event.set()
+
+
+def sync_mirror() -> bool:
+    """Tire les onglets suivis en un seul appel. Retourne False si Sheets n'a pas répondu."""
+    if spreadsheet is None:
+        return False
+    db = get_local_db()
+    debut = time.monotonic()
+    try:
+        refresh_worksheets()
+        titles = [t for t in list(_worksheets) if is_mirrored(t)]
+        known = {r['titre']: r['lignes'] for r in db.execute('SELECT titre, lignes FROM miroir_onglets')}
+        en_attente = {r['onglet'] for r in db.execute('SELECT DISTINCT onglet FROM operations_attente')}
+        ranges = []
+        for t in titles:
+            if t.startswith('Poste_'):
+                n = known.get(t, 0)
+                ranges.append(gspread.utils.absolute_range_name(t, f"A{n + 1}:{MIRROR_LAST_COL}{n + MIRROR_CHUNK}"))
+            else:
+                ranges.append(gspread.utils.absolute_range_name(t))
+        value_ranges = spreadsheet.values_batch_get(ranges).get('valueRanges', []) if ranges else []
+    except Exception as e:
+        _mirror_state['en_ligne'] = False
+        _mirror_state['derniere_erreur'] = str(e)
+        print(f"Erreur synchro miroir: {e}")
+        return False
+    encore = False
+    for t, vr in zip(titles, value_ranges):
+        values = vr.get('values', [])
+        if t.startswith('Poste_'):
+            encore = encore or len(values) == MIRROR_CHUNK
+            if known.get(t, 0) == 0:
+                mirror_replace(t, values)
+            elif values:
+                with local_db_transaction(db):
+                    _mirror_put(db, t, known[t] + 1, values)
+        elif _mirror_writes.get(t, 0) < debut and t not in en_attente:
+            # Sinon une écriture locale a eu lieu pendant la lecture, ou des modifications hors
+            # ligne n'ont pas encore été rejouées : on attend le prochain passage
+            if mirror_replace(t, values):
+                invalidate_row_index(t)  # lignes peut-être supprimées ou triées dans Sheets
+                if t.startswith('Table_'):
+                    invalidate_table_cache(t[len('Table_'):])
+    disparus = [t for t in known if t not in titles]
+    if disparus:
+        with local_db_transaction(db):
+            db.executemany('DELETE FROM miroir_lignes WHERE titre = ?', [(t,) for t in disparus])
+            db.executemany('DELETE FROM miroir_onglets WHERE titre = ?', [(t,) for t in disparus])
+    if encore:
+        _mirror_event.set()  # gros onglet Poste_* : on continue au prochain tour
+    _mirror_state['en_ligne'] = True
+    _mirror_state['derniere_synchro'] = datetime.now().isoformat(timespec='seconds')
+    _mirror_state['duree_ms'] = round((time.monotonic() - debut) * 1000)
+    return True
+
+
+def mirror_status() -> dict:
+    onglets = {r['titre']: {'lignes': max(r['lignes'] - 1, 0),
+                            'synchro_le': datetime.fromtimestamp(r['synchro_le']).isoformat(timespec='seconds')}
+               for r in get_local_db().execute('SELECT titre, lignes, synchro_le FROM miroir_onglets ORDER BY titre')}
+    return {**_mirror_state, 'onglets': onglets}
+
+
+def _mirror_worker():
+    delay = MIRROR_SYNC_INTERVAL
+    while True:
+        try:
+            ok = sync_mirror()
+        except Exception as e:
+            print(f"Erreur worker miroir: {e}")
+            ok = False
+        delay = MIRROR_SYNC_INTERVAL if ok else min(delay * 2, MIRROR_RETRY_MAX_DELAY)
+        _mirror_event.wait(delay)
+        _mirror_event.clear()
+
+
+# ============================================================================
+# MODIFICATIONS HORS LIGNE
+# ============================================================================
+# Les modifications des tables et des utilisateurs passent par write_sheet_row().
+# Si Sheets est injoignable, ou si des opérations attendent déjà (pour garder
+# l'ordre), l'opération est enregistrée dans la base locale et appliquée au
+# miroir. Le worker du journal la rejoue ensuite dans l'ordre. Les opérations
+# visent la clé de la colonne A (ID, Identifiant), pas un numéro de ligne qui
+# peut changer entre-temps.
+
+OPERATIONS_MAX_TENTATIVES = 10  # au-delà, une opération refusée par Sheets est abandonnée
+
+
+def is_offline_error(e: Exception) -> bool:
+    """Erreur de liaison (réseau, quota, panne Google) plutôt que requête invalide"""
+    if isinstance(e, (OSError, TransportError)):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        code = getattr(e, 'code', 0) or 0
+        return code == 429 or code >= 500
+    return False
+
+
+def _key_normalizer(title: str):
+    return str.lower if title == 'Utilisateurs' else str
+
+
+def run_sheet_operation(title: str, action: str, key: str, values: list, first_col: int = 1, replay: bool = False) -> bool:
+    """Exécute l'opération sur Sheets. Retourne False si la ligne visée n'existe pas.
+    Un rejeu ne touche pas au miroir, qui contient déjà l'opération."""
+    sheet = get_worksheet(title)
+    normalize = _key_normalizer(title)
+    if action == 'append':
+        if replay and find_row(sheet, key, normalize) is not None:
+            return True  # déjà écrite par un envoi dont la réponse s'est perdue
+        response = sheet.append_row(values)
+        if not replay:
+            mirror_appended(title, response, [values])
+        return True
+    row_num = find_row(sheet, key, normalize)
+    if row_num is None:
+        return False
+    if action == 'update':
+        update_row_range(sheet, row_num, first_col, values, mirror=not replay)
+    else:
+        delete_row(sheet, row_num, mirror=not replay)
+    return True
+
+
+def queue_operation(title: str, action: str, key: str, values: list, first_col: int = 1) -> bool:
+    db = get_local_db()
+    with local_db_transaction(db):
+        row_num = mirror_find_row(db, title, key, _key_normalizer(title))
+        if action == 'append':
+            last = db.execute('SELECT lignes FROM miroir_onglets WHERE titre = ?', (title,)).fetchone()
+            if last:
+                _mirror_put(db, title, last['lignes'] + 1, [values])
+        elif row_num is None:
+            return False
+        elif action == 'update':
+            _mirror_patch(db, title, row_num, first_col, values)
+        else:
+            _mirror_remove(db, title, row_num)
+        db.execute(
+            'INSERT INTO operations_attente (onglet, action, cle, valeurs, colonne, cree_le) VALUES (?, ?, ?, ?, ?, ?)',
+            (title, action, key, json.dumps(values, ensure_ascii=False), first_col, time.time())
+        )
+    _mirror_writes[title] = time.monotonic()
+    _journal_event.set()
+    return True
+
+
+def write_sheet_row(title: str, action: str, key: str, values: list = None, first_col: int = 1) -> bool:
+    """append / update / delete d'une ligne repérée par sa clé, en direct si possible, sinon mise en
+    attente. Retourne False si la ligne visée n'existe pas."""
+    values = values or []
+    if spreadsheet is not None and not operations_pending():
+        try:
+            return run_sheet_operation(title, action, key, values, first_col)
+        except Exception as e:
+            if not is_offline_error(e):
+                raise
+            print(f"Sheets injoignable, modification mise en attente: {e}")
+    return queue_operation(title, action, key, values, first_col)
+
+
+def operations_pending() -> int:
+    return get_local_db().execute('SELECT COUNT(*) FROM operations_attente').fetchone()[0]
+
+
+def flush_operations() -> bool:
+    """Rejoue les opérations en attente dans l'ordre ; s'arrête à la première qui échoue"""
+    if spreadsheet is None:
+        return False
+    db = get_local_db()
+    touched = set()
+    ok = True
+    for op in db.execute('SELECT * FROM operations_attente ORDER BY id').fetchall():
+        try:
+            if not run_sheet_operation(op['onglet'], op['action'], op['cle'], json.loads(op['valeurs']),
+                                       op['colonne'], replay=True):
+                print(f"Opération abandonnée ({op['action']} {op['onglet']} {op['cle']}): ligne introuvable")
+        except Exception as e:
+            if is_offline_error(e) or op['tentatives'] + 1 < OPERATIONS_MAX_TENTATIVES:
+                db.execute('UPDATE operations_attente SET tentatives = tentatives + 1, erreur = ? WHERE id = ?',
+                           (str(e), op['id']))
+                _journal_state['derniere_erreur'] = f"{op['onglet']}: {e}"
+                print(f"Erreur rejeu {op['onglet']}: {e}")
+                ok = False
+                break
+            print(f"Opération abandonnée ({op['action']} {op['onglet']} {op['cle']}): {e}")
+        db.execute('DELETE FROM operations_attente WHERE id = ?', (op['id'],))
+        touched.add(op['onglet'])
+    for title in touched:
+        if title.startswith('Table_'):
+            invalidate_table_cache(title[len('Table_'):])
+    if touched:
+        _mirror_event.set()  # on relit Sheets pour repartir d'un miroir identique
+    return ok
+
+
+def operations_status() -> dict:
+    row = get_local_db().execute(
+        'SELECT COUNT(*) AS n, MIN(cree_le) AS plus_ancien, MAX(tentatives) AS tentatives FROM operations_attente'
+    ).fetchone()
+    return {
+        'en_attente': row['n'],
+        'plus_ancien': datetime.fromtimestamp(row['plus_ancien']).isoformat(timespec='seconds') if row['plus_ancien'] else None,
+        'tentatives': row['tentatives'] or 0
+    }
+
+
+# ============================================================================
+# BUS D'ÉVÉNEMENTS
+# ============================================================================
+# Impressions, compteurs et révisions de tables sont publiés à tous les
+# abonnés de /api/events (Server-Sent Events) : les tablettes d'un poste aval
+# voient les nouveaux numéros sans relire Sheets. Chaque abonné a sa file ;
+# un client trop lent perd sa connexion plutôt que de ralentir les autres.
+
+EVENTS_QUEUE_MAX = 200
+EVENTS_KEEPALIVE = 25  # secondes entre deux commentaires de maintien
+
+_event_subscribers = set()
+_event_subscribers_lock = threading.Lock()
+
+
+def publish_event(event: str, data: dict):
+    with _event_subscribers_lock:
+        subscribers = list(_event_subscribers)
+    for q in subscribers:
+        try:
+            q.put_nowait((event, data))
+        except queue.Full:
+            unsubscribe_events(q)
+            try:
+                q.get_nowait()
+                q.put_nowait((None, None))  # signale au flux de se fermer
+            except (queue.Empty, queue.Full):
+                pass
+
+
+def subscribe_events() -> queue.Queue:
+    q = queue.Queue(maxsize=EVENTS_QUEUE_MAX)
+    with _event_subscribers_lock:
+        _event_subscribers.add(q)
+    return q
+
+
+def unsubscribe_events(q: queue.Queue):
+    with _event_subscribers_lock:
+        _event_subscribers.discard(q)
+
+
+# ============================================================================
+# COMPTEURS
+# ============================================================================
+# Les compteurs de numérotation vivent dans la base locale, pas dans
+# config.json : la réservation est atomique (BEGIN IMMEDIATE), donc deux
+# tablettes sur le même poste obtiennent des numéros distincts, et une série
+# peut réserver une plage entière en un seul appel. La valeur 'compteur' de la
+# config ne sert plus que de valeur initiale pour un poste encore inconnu.
+
+COMPTEUR_MAX = 1000000
+
+_compteurs_revision = 0  # incrémentée après chaque modification validée (ETag de /api/postes)
+
+
+def _compteurs_changed(poste_id: str, valeur):
+    """À appeler une fois la modification validée (hors transaction)"""
+    global _compteurs_revision
+    _compteurs_revision += 1
+    publish_event('compteur', {'poste_id': poste_id, 'valeur': valeur})
+
+
+def get_compteurs() -> dict:
+    return {r['poste_id']: r['valeur'] for r in get_local_db().execute('SELECT poste_id, valeur FROM compteurs')}
+
+
+def get_compteur(poste: dict) -> int:
+    row = get_local_db().execute('SELECT valeur FROM compteurs WHERE poste_id = ?', (poste['id'],)).fetchone()
+    return row['valeur'] if row else int(poste.get('compteur', 0))
+
+
+def set_compteur(poste_id: str, valeur: int):
+    db = get_local_db()
+    db.execute(
+        'INSERT INTO compteurs (poste_id, valeur) VALUES (?, ?) ON CONFLICT (poste_id) DO UPDATE SET valeur = excluded.valeur',
+        (poste_id, valeur % COMPTEUR_MAX)
+    )
+    if not db.in_transaction:
+        _compteurs_changed(poste_id, valeur % COMPTEUR_MAX)
+
+
+def reserve_numeros(poste: dict, nombre: int = 1) -> int:
+    """Réserve `nombre` numéros consécutifs et retourne le premier"""
+    db = get_local_db()
+    with local_db_transaction(db):
+        debut = get_compteur(poste)
+        set_compteur(poste['id'], debut + nombre)
+    _compteurs_changed(poste['id'], (debut + nombre) % COMPTEUR_MAX)
+    return debut
+
+
+def release_numeros(poste: dict, debut: int, nombre: int = 1) -> bool:
+    """Rend une plage réservée (impression échouée), seulement si aucun numéro n'a été pris depuis"""
+    db = get_local_db()
+    with local_db_transaction(db):
+        if get_compteur(poste) != (debut + nombre) % COMPTEUR_MAX:
+            return False
+        set_compteur(poste['id'], debut)
+    _compteurs_changed(poste['id'], debut)
+    return True
+
+
+def delete_compteur(poste_id: str):
+    get_local_db().execute('DELETE FROM compteurs WHERE poste_id = ?', (poste_id,))
+    _compteurs_changed(poste_id, None)
+
+
+def with_compteurs(postes: list) -> list:
+    """Copie des postes avec la valeur courante de leur compteur"""
+    compteurs = get_compteurs()
+    return [{**p, 'compteur': compteurs.get(p['id'], p.get('compteur', 0))} for p in postes]
+
+
+# ============================================================================
+# CACHE DES TABLES
+# ============================================================================
+# Les tables de référence changent rarement : elles sont servies depuis la
+# mémoire et seules les écritures (add/update/delete) atteignent Sheets.
+# Le TTL couvre les modifications faites directement dans Google Sheets.
+# Une table peut surcharger son TTL avec la clé 'cache_ttl' de sa config.
+
+TABLE_CACHE_TTL_DEFAUT = 300  # secondes
+TABLE_CACHE_TTL = {'essences': 3600, 'produits': 3600, 'epaisseurs': 3600, 'qualites': 600}
+
+_table_cache = {}  # table_id -> (expiration monotonic, records)
+_table_cache_locks = {}  # table_id -> Lock (une seule lecture Sheets à la fois par table)
+_table_cache_stats = {'hits': 0, 'misses': 0, 'miroir': 0, 'invalidations': 0}
+_table_revisions = {}  # table_id -> révision (ETag), '*' pour les invalidations globales
+
+
+def _table_ttl(table_id: str, table_config: dict = None) -> float:
+    if table_config and table_config.get('cache_ttl') is not None:
+        return float(table_config['cache_ttl'])
+    return TABLE_CACHE_TTL.get(table_id, TABLE_CACHE_TTL_DEFAUT)
+
+
+def invalidate_table_cache(table_id: str = None):
+    """Invalide une table (ou tout le cache si table_id est None)"""
+    if table_id is None:
+        _table_cache.clear()
+    else:
+        _table_cache.pop(table_id, None)
+    _table_cache_stats['invalidations'] += 1
+    bump_table_revision(table_id or '*')
+
+
+def bump_table_revision(table_id: str):
+    _table_revisions[table_id] = _table_revisions.get(table_id, 0) + 1
+    publish_event('table', {'table_id': table_id, 'revision': table_revision(table_id)})
+
+
+def table_revision(table_id: str) -> str:
+    return f"{_table_revisions.get('*', 0)}.{_table_revisions.get(table_id, 0)}"
+
+
+# Index des tables filtrées par les tablettes (qualités par essence et produit,
+# épaisseurs par essence) : reconstruits seulement quand get_table_values()
+# sert une nouvelle liste (écriture, synchro du miroir, expiration).
+_table_indexes = {}  # (table_id, colonnes) -> (liste indexée, {valeurs: lignes})
+
+
+def get_table_index(table_id: str, colonnes: tuple) -> dict:
+    """Lignes de la table groupées par valeurs (en majuscules) des colonnes données"""
+    records = get_table_values(table_id)
+    entry = _table_indexes.get((table_id, colonnes))
+    if entry and entry[0] is records:
+        return entry[1]
+    index = {}
+    for r in records:
+        index.setdefault(tuple(str(r.get(c, '')).upper() for c in colonnes), []).append(r)
+    _table_indexes[(table_id, colonnes)] = (records, index)
+    return index
+
+
+# Journal des modifications par table, pour /api/tables/<id>/changes : chaque
+# nouvelle liste servie par get_table_values() est comparée ligne à ligne (par
+# ID) à la précédente, ce qui couvre les écritures de l'appli comme les
+# modifications faites dans Google Sheets. La révision est préfixée par
+# l'identifiant de démarrage : un client d'un process précédent recharge tout.
+TABLE_CHANGES_MAX = 500  # modifications gardées par table
+
+_table_changes = {}  # table_id -> {'revision', 'source', 'rows', 'log'}
+_table_changes_lock = threading.Lock()
+
+
+def table_change_log(table_id: str, table_config: dict = None) -> dict:
+    """État du journal de la table, mis à jour d'après la liste actuellement servie"""
+    records = get_table_values(table_id, table_config)
+    with _table_changes_lock:
+        state = _table_changes.get(table_id)
+        if state is None:
+            state = _table_changes[table_id] = {
+                'revision': 0, 'source': records, 'log': deque(maxlen=TABLE_CHANGES_MAX),
+                'rows': {str(r.get('ID')): r for r in records}
+            }
+        elif state['source'] is not records:
+            rows = {str(r.get('ID')): r for r in records}
+            old = state['rows']
+            changed = [i for i, r in rows.items() if old.get(i) != r] + [i for i in old if i not in rows]
+            if changed:
+                state['revision'] += 1
+                state['log'].extend((state['revision'], i) for i in changed)
+            state['source'], state['rows'] = records, rows
+        return state
+
+
+def table_changes(table_id: str, since: str, table_config: dict = None) -> dict:
+    """Lignes ajoutées/modifiées et IDs supprimés depuis la révision `since`,
+    ou la table entière ('full') si le journal ne remonte pas jusque-là"""
+    state = table_change_log(table_id, table_config)
+    with _table_changes_lock:
+        revision, log, rows = state['revision'], list(state['log']), state['rows']
+        values = state['source']
+    current = f"{BOOT_ID}.{revision}"
+    boot, _, n = (since or '').partition('.')
+    n = int(n) if n.isdigit() else -1
+    # Journal plein : les entrées de la plus ancienne révision peuvent être incomplètes
+    tronque = len(log) == TABLE_CHANGES_MAX and n < log[0][0]
+    if boot != BOOT_ID or n < 0 or n > revision or tronque:
+        return {'revision': current, 'full': True, 'values': values}
+    ids = {i for rev, i in log if rev > n}
+    return {
+        'revision': current,
+        'full': False,
+        'upserts': [r for r in values if str(r.get('ID')) in ids],
+        'deletes': [i for i in ids if i not in rows]
+    }
+
+
+def table_cache_stats() -> dict:
+    now = time.monotonic()
+    total = _table_cache_stats['hits'] + _table_cache_stats['misses']
+    return {
+        **_table_cache_stats,
+        'hit_ratio': round(_table_cache_stats['hits'] / total, 3) if total else 0,
+        'tables': {tid: {'lignes': len(records), 'expire_dans': round(exp - now, 1)}
+                   for tid, (exp, records) in list(_table_cache.items())}
+    }
+
+
 # ============================================================================
 # TABLES DE RÉFÉRENCE
 # ============================================================================
@@ -847,9 +1447,9 @@ def get_or_create_table_sheet(table_id: str, table_config: dict):
     sheet_name = f"Table_{table_id}"
     colonnes = table_config.get('colonnes', [{'id': 'valeur', 'nom': 'Valeur'}])
     try:
-        return spreadsheet.worksheet(sheet_name)
+        return get_worksheet(sheet_name)
     except gspread.WorksheetNotFound:
-        sheet = spreadsheet.add_worksheet(title=sheet_name, rows=500, cols=len(colonnes) + 1)
+        sheet = add_worksheet(title=sheet_name, rows=500, cols=len(colonnes) + 1)
         headers = ['ID'] + [c['nom'] for c in colonnes]
         sheet.append_row(headers)
         print(f"  → Table {table_config.get('nom', table_id)} créée")
@@ -857,122 +1457,474 @@ def get_or_create_table_sheet(table_id: str, table_config: dict):
 
 
 def get_table_values(table_id: str, table_config: dict = None) -> list:
-    if spreadsheet is None:
-        return []
-    try:
-        sheet = spreadsheet.worksheet(f"Table_{table_id}")
-        return sheet.get_all_records()
-    except:
-        return []
+    """Lecture via le cache mémoire, puis le miroir local, Google Sheets seulement si la table
+    n'est pas encore dans le miroir. La liste retournée est partagée : ne pas la modifier."""
+    entry = _table_cache.get(table_id)
+    if entry and entry[0] > time.monotonic():
+        _table_cache_stats['hits'] += 1
+        return entry[1]
+    with _table_cache_locks.setdefault(table_id, threading.Lock()):
+        # Une autre requête a pu remplir le cache pendant l'attente
+        entry = _table_cache.get(table_id)
+        if entry and entry[0] > time.monotonic():
+            _table_cache_stats['hits'] += 1
+            return entry[1]
+        _table_cache_stats['misses'] += 1
+        generation = _table_cache_stats['invalidations']
+        records = mirror_records(f"Table_{table_id}")
+        if records is not None:
+            _table_cache_stats['miroir'] += 1
+            if _table_cache_stats['invalidations'] == generation:
+                _table_cache[table_id] = (time.monotonic() + _table_ttl(table_id, table_config), records)
+            return records
+        if spreadsheet is None:
+            return entry[1] if entry else []
+        try:
+            if table_config:
+                sheet = get_or_create_table_sheet(table_id, table_config)
+            else:
+                sheet = get_worksheet(f"Table_{table_id}")
+            records = sheet.get_all_records()
+        except gspread.WorksheetNotFound:
+            records = []
+        except Exception as e:
+            print(f"Erreur lecture table {table_id}: {e}")
+            # En cas d'erreur, on sert la dernière version connue plutôt que rien
+            return entry[1] if entry else []
+        # Ne pas mettre en cache une lecture concurrente d'une écriture
+        if _table_cache_stats['invalidations'] == generation:
+            _table_cache[table_id] = (time.monotonic() + _table_ttl(table_id, table_config), records)
+            if entry and entry[1] != records:
+                bump_table_revision(table_id)  # modifiée directement dans Google Sheets
+        return records
 
 
 def add_table_value(table_id: str, table_config: dict, data: dict) -> bool:
-    if spreadsheet is None:
-        return False
     try:
-        sheet = spreadsheet.worksheet(f"Table_{table_id}")
-        records = sheet.get_all_records()
-        new_id = len(records) + 1
+        records = get_table_values(table_id, table_config)
+        # Plus grand ID + 1 : les opérations hors ligne visent la ligne par son ID, qui doit rester unique
+        new_id = max((r['ID'] for r in records if isinstance(r.get('ID'), int)), default=0) + 1
         colonnes = table_config.get('colonnes', [])
         row = [new_id] + [data.get(col['id'], '') for col in colonnes]
-        sheet.append_row(row)
-        return True
+        return write_sheet_row(f"Table_{table_id}", 'append', str(new_id), row)
     except Exception as e:
         print(f"Erreur ajout table: {e}")
         return False
+    finally:
+        invalidate_table_cache(table_id)
 
 
 def update_table_value(table_id: str, table_config: dict, row_id: int, data: dict) -> bool:
-    if spreadsheet is None:
-        return False
     try:
-        sheet = spreadsheet.worksheet(f"Table_{table_id}")
-        records = sheet.get_all_records()
         colonnes = table_config.get('colonnes', [])
-        for i, row in enumerate(records):
-            if row.get('ID') == row_id:
-                row_num = i + 2
-                for j, col in enumerate(colonnes):
-                    sheet.update_cell(row_num, j + 2, data.get(col['id'], ''))
-                return True
-        return False
+        if not colonnes:
+            return True
+        return write_sheet_row(f"Table_{table_id}", 'update', str(row_id), [data.get(col['id'], '') for col in colonnes], 2)
     except Exception as e:
         print(f"Erreur update: {e}")
         return False
+    finally:
+        invalidate_table_cache(table_id)
 
 
 def delete_table_value(table_id: str, row_id: int) -> bool:
-    if spreadsheet is None:
-        return False
     try:
-        sheet = spreadsheet.worksheet(f"Table_{table_id}")
-        records = sheet.get_all_records()
-        for i, row in enumerate(records):
-            if row.get('ID') == row_id:
-                sheet.delete_rows(i + 2)
-                return True
-        return False
+        return write_sheet_row(f"Table_{table_id}", 'delete', str(row_id))
     except Exception as e:
         print(f"Erreur delete: {e}")
         return False
+    finally:
+        invalidate_table_cache(table_id)
+
+# Import en masse : les lignes reçues sont rapprochées des lignes existantes
+# par clé naturelle (surchargeable par la clé 'cle' de la config de la table),
+# puis écrites en un append_rows et un batch_update.
+TABLE_NATURAL_KEYS = {
+    'essences': ('code',),
+    'produits': ('code',),
+    'qualites': ('essence', 'produit', 'code'),
+    'epaisseurs': ('essence', 'ep_sec'),
+}
+
+
+def _cell_key(value) -> str:
+    """Forme comparable d'une cellule : '18', 18 et '18,0' se valent"""
+    text = str(value).strip()
+    try:
+        number = float(text.replace(',', '.'))
+        return str(int(number)) if number.is_integer() else str(number)
+    except ValueError:
+        return text.upper()
+
+
+def table_natural_key(table_id: str, table_config: dict) -> tuple:
+    colonnes = [c['id'] for c in table_config.get('colonnes', [])]
+    key = tuple(table_config.get('cle') or TABLE_NATURAL_KEYS.get(table_id) or (('code',) if 'code' in colonnes else ()))
+    if not key or any(k not in colonnes for k in key):
+        raise ValueError(f"Pas de clé naturelle pour la table {table_id}")
+    return key
+
+
+def _row_hash(cells: list) -> str:
+    keys = [_cell_key(c) for c in cells]
+    while keys and keys[-1] == '':
+        keys.pop()
+    data = json.dumps(keys, ensure_ascii=False)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def plan_table_upsert(table_id: str, table_config: dict, values: list, rows: list, ecrites: dict = None) -> dict:
+    """Rapproche les lignes reçues des valeurs brutes de l'onglet (en-tête compris).
+    Retourne les lignes à ajouter, les lignes à réécrire (numéro -> cellules) et le nombre
+    de lignes déjà à jour ; l'onglet n'est pas modifié.
+    ecrites (clé -> empreinte de la ligne telle qu'écrite la dernière fois) : une ligne n'est
+    alors réécrite que si elle n'a pas changé depuis, et une clé connue absente de l'onglet
+    (supprimée) n'est pas rajoutée ; les unes et les autres sont comptées 'protegees'.
+    'empreintes' donne l'empreinte des lignes conformes après application du plan."""
+    colonnes = table_config.get('colonnes', [])
+    key_cols = table_natural_key(table_id, table_config)
+    headers = values[0] if values else ['ID'] + [c['nom'] for c in colonnes]
+    # Position des colonnes d'après l'en-tête réel, sinon d'après la config
+    index = {c['id']: headers.index(c['nom']) if c['nom'] in headers else i + 1 for i, c in enumerate(colonnes)}
+    width = max([len(headers)] + [i + 1 for i in index.values()])
+    existing = {}
+    max_id = 0
+    for row_num, cells in enumerate(values[1:], start=2):
+        if not cells:
+            continue
+        cells = cells + [''] * (width - len(cells))
+        existing[tuple(_cell_key(cells[index[k]]) for k in key_cols)] = (row_num, cells)
+        if str(cells[0]).isdigit():
+            max_id = max(max_id, int(cells[0]))
+
+    # Une même clé reçue plusieurs fois : les valeurs se cumulent, la dernière l'emporte
+    incoming = {}
+    for data in rows:
+        key = tuple(_cell_key(data.get(k, '')) for k in key_cols)
+        incoming[key] = {**incoming.get(key, {}), **data}
+
+    appends, updates, inchangees, protegees, empreintes = [], {}, 0, 0, {}
+    for key, data in incoming.items():
+        cle = json.dumps(key, ensure_ascii=False)
+        if key in existing:
+            row_num, cells = existing[key]
+            merged = list(cells)
+            for c in colonnes:
+                if c['id'] in data:
+                    merged[index[c['id']]] = data[c['id']]
+            if _row_hash(merged) == _row_hash(cells):
+                inchangees += 1
+                empreintes[cle] = _row_hash(cells)
+                continue
+            if ecrites is not None and ecrites.get(cle) != _row_hash(cells):
+                protegees += 1  # modifiée depuis dans Sheets, l'interface ou un import
+                continue
+            updates[row_num] = merged
+            empreintes[cle] = _row_hash(merged)
+        elif ecrites is not None and cle in ecrites:
+            protegees += 1  # déjà écrite puis supprimée par un utilisateur : on ne la remet pas
+        else:
+            max_id += 1
+            row = [max_id] + [data.get(c['id'], '') for c in colonnes]
+            appends.append(row)
+            empreintes[cle] = _row_hash(row)
+    last_col = gspread.utils.rowcol_to_a1(1, width).rstrip('1')
+    return {'appends': appends, 'updates': updates, 'inchangees': inchangees, 'protegees': protegees,
+            'empreintes': empreintes, 'last_col': last_col}
+
+
+def bulk_upsert_table_values(table_id: str, table_config: dict, rows: list) -> dict:
+    """Ajoute ou met à jour les lignes par clé naturelle. En ligne : une lecture, un append_rows,
+    un batch_update. Hors ligne : une opération en attente par ligne modifiée."""
+    title = f"Table_{table_id}"
+    live = spreadsheet is not None and not operations_pending()
+    try:
+        if live:
+            sheet = get_worksheet(title)
+            values = sheet.get_all_values()
+        else:
+            values = mirror_values(title)
+            if values is None:
+                raise ConnectionError('Google Sheets non connecté')
+        plan = plan_table_upsert(table_id, table_config, values, rows)
+        updates, appends = plan['updates'], plan['appends']
+        if live:
+            if updates:
+                sheet.batch_update([{'range': f"B{n}:{plan['last_col']}{n}", 'values': [cells[1:]]} for n, cells in updates.items()],
+                                   value_input_option='USER_ENTERED')
+                for n, cells in updates.items():
+                    mirror_update(title, n, 2, cells[1:])
+            if appends:
+                mirror_appended(title, sheet.append_rows(appends), appends)
+        else:
+            for cells in updates.values():
+                queue_operation(title, 'update', str(cells[0]), cells[1:], 2)
+            for row in appends:
+                queue_operation(title, 'append', str(row[0]), row)
+        return {'ajoutees': len(appends), 'modifiees': len(updates), 'inchangees': plan['inchangees']}
+    finally:
+        invalidate_table_cache(table_id)
+
+
+# Réconciliation des données de référence du code (registre ESSENCES,
+# PRODUITS_DATA, EPAISSEURS_DATA) avec leurs onglets : une lecture values_batch_get pour toutes
+# les tables, comparaison par clé naturelle et empreinte de ligne, puis un seul
+# values_batch_update pour les lignes modifiées de toutes les tables. Les lignes
+# nouvelles passent par un append_rows par table concernée, qui ne peut pas
+# écraser une ligne ajoutée entre-temps depuis l'interface. Lancée au démarrage
+# puis toutes les REFERENCE_SYNC_INTERVAL secondes.
+# L'empreinte de chaque ligne écrite (ou trouvée conforme) est gardée dans
+# references_empreintes : une ligne n'est corrigée que si elle n'a pas bougé
+# depuis, et une ligne déjà écrite puis supprimée n'est pas rajoutée. Une
+# modification ou une suppression faite par un administrateur ou un import l'emporte.
+
+REFERENCE_DATA = {'essences': ESSENCES, 'produits': PRODUITS_DATA, 'epaisseurs': EPAISSEURS_DATA}
+REFERENCE_SYNC_INTERVAL = 3600  # secondes
+
+_reference_lock = threading.Lock()
+_reference_state = {'derniere_execution': None, 'duree_ms': None, 'derniere_erreur': None, 'tables': {}}
+
+
+def reconcile_reference_tables() -> dict:
+    """Retourne le bilan par table, ou None si Sheets n'est pas disponible"""
+    # Des modifications hors ligne en attente : on les laisse passer d'abord
+    if spreadsheet is None or operations_pending():
+        return None
+    with _reference_lock:
+        debut = time.monotonic()
+        try:
+            config = get_config()
+            tables = []
+            for table_id, data in REFERENCE_DATA.items():
+                table_cfg = next((t for t in config.get('tables', []) if t['id'] == table_id), None)
+                if table_cfg and get_or_create_table_sheet(table_id, table_cfg):
+                    tables.append((table_id, table_cfg, data))
+            ranges = [gspread.utils.absolute_range_name(f"Table_{table_id}") for table_id, _, _ in tables]
+            value_ranges = spreadsheet.values_batch_get(ranges).get('valueRanges', []) if ranges else []
+            db = get_local_db()
+            ecrites = {table_id: {} for table_id, _, _ in tables}
+            for r in db.execute('SELECT table_id, cle, empreinte FROM references_empreintes'):
+                if r['table_id'] in ecrites:
+                    ecrites[r['table_id']][r['cle']] = r['empreinte']
+            plans = {table_id: plan_table_upsert(table_id, table_cfg, vr.get('values', []), data, ecrites[table_id])
+                     for (table_id, table_cfg, data), vr in zip(tables, value_ranges)}
+
+            updates = [{'range': gspread.utils.absolute_range_name(f"Table_{table_id}", f"B{n}:{plan['last_col']}{n}"),
+                        'values': [cells[1:]]}
+                       for table_id, plan in plans.items() for n, cells in plan['updates'].items()]
+            if updates:
+                spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': updates})
+            bilan = {}
+            for table_id, plan in plans.items():
+                title = f"Table_{table_id}"
+                for n, cells in plan['updates'].items():
+                    mirror_update(title, n, 2, cells[1:])
+                if plan['appends']:
+                    mirror_appended(title, get_worksheet(title).append_rows(plan['appends']), plan['appends'])
+                with local_db_transaction(db):
+                    db.executemany('INSERT OR REPLACE INTO references_empreintes (table_id, cle, empreinte) VALUES (?, ?, ?)',
+                                   [(table_id, cle, empreinte) for cle, empreinte in plan['empreintes'].items()])
+                bilan[table_id] = {'ajoutees': len(plan['appends']), 'modifiees': len(plan['updates']),
+                                   'inchangees': plan['inchangees'], 'protegees': plan['protegees']}
+                if plan['appends'] or plan['updates']:
+                    invalidate_table_cache(table_id)
+                    print(f"  → {table_id}: {len(plan['appends'])} ajoutée(s), {len(plan['updates'])} modifiée(s)")
+        except Exception as e:
+            print(f"Erreur réconciliation tables: {e}")
+            _reference_state['derniere_erreur'] = str(e)
+            return None
+        _reference_state.update(derniere_execution=datetime.now().isoformat(timespec='seconds'),
+                                duree_ms=round((time.monotonic() - debut) * 1000), derniere_erreur=None, tables=bilan)
+        return bilan
+
+
+def _reference_worker():
+    while True:
+        time.sleep(REFERENCE_SYNC_INTERVAL)
+        reconcile_reference_tables()
 
 
 # ============================================================================
 # UTILISATEURS
 # ============================================================================
 
-def get_users() -> dict:
-    default = {'admin': {'password': '123456', 'nom': 'Administrateur', 'initiales': 'AD', 'droits': 'admin', 'postes': []}}
-    if spreadsheet is None:
-        return default
+# Annuaire gardé en mémoire : une connexion ne lit jamais Google Sheets. Il est
+# rechargé (miroir local, sinon Sheets) en arrière-plan toutes les
+# USERS_REFRESH_INTERVAL secondes et aussitôt après une modification
+# d'utilisateur. Les PIN n'y figurent que sous forme d'empreinte salée.
+
+USERS_REFRESH_INTERVAL = 60  # secondes
+PIN_HASH_ITERATIONS = 50_000
+_users_lock = threading.Lock()
+_users_cache = {'users': None, 'charge_le': 0.0, 'en_cours': False}
+# Empreintes déjà calculées, par HMAC (clé aléatoire du processus) de identifiant:PIN :
+# un rechargement ne refait pas le PBKDF2 d'un PIN inchangé
+_pin_cache_key = os.urandom(32)
+_pin_hashes = {}
+
+
+def hash_pin(pin: str, salt: bytes = None) -> tuple:
+    salt = salt or os.urandom(16)
+    return salt, hashlib.pbkdf2_hmac('sha256', pin.encode(), salt, PIN_HASH_ITERATIONS)
+
+
+def check_pin(user: dict, pin: str) -> bool:
+    salt, expected = user['pin']
+    return hmac.compare_digest(hash_pin(str(pin), salt)[1], expected)
+
+
+def _pin_entry(hashes: dict, uid: str, pin: str) -> tuple:
+    """Empreinte salée du PIN, reprise du cache si le PIN n'a pas changé (un HMAC),
+    sinon calculée ; hashes reçoit les entrées de l'annuaire en cours de chargement"""
+    tag = hmac.new(_pin_cache_key, f"{uid}:{pin}".encode(), 'sha256').digest()
+    entry = _pin_hashes.get(tag) or hash_pin(pin)
+    hashes[tag] = entry
+    return entry
+
+
+def _default_users(hashes: dict) -> dict:
+    return {'admin': {'pin': _pin_entry(hashes, 'admin', '123456'), 'nom': 'Administrateur', 'initiales': 'AD', 'droits': 'admin', 'postes': []}}
+
+
+def _load_users() -> dict:
+    """Annuaire (miroir local, sinon Sheets) ; le cache des empreintes ne garde que ses PIN"""
+    global _pin_hashes
+    hashes = {}
+    users = _read_users(hashes)
+    _pin_hashes = hashes
+    return users
+
+
+def _read_users(hashes: dict) -> dict:
+    records = mirror_records('Utilisateurs')
+    if records is None:
+        if spreadsheet is None:
+            return _default_users(hashes)
+        records = get_worksheet('Utilisateurs').get_all_records()
+    users = {}
+    for row in records:
+        uid = row.get('Identifiant', '')
+        if uid:
+            nom = row.get('Nom', uid)
+            postes_str = str(row.get('Postes', ''))
+            users[uid] = {
+                'pin': _pin_entry(hashes, uid, str(row.get('Mot de passe', ''))),
+                'nom': nom,
+                'initiales': row.get('Initiales', nom[:2].upper()),
+                'droits': row.get('Droits', 'operateur'),
+                'postes': [p.strip() for p in postes_str.split(',') if p.strip()]
+            }
+    return users if users else _default_users(hashes)
+
+
+def refresh_users():
+    """Recharge l'annuaire ; en cas d'échec, l'annuaire précédent reste en place"""
     try:
-        sheet = spreadsheet.worksheet('Utilisateurs')
-        records = sheet.get_all_records()
-        if not records:
-            return default
-        users = {}
-        for row in records:
-            uid = row.get('Identifiant', '')
-            if uid:
-                nom = row.get('Nom', uid)
-                postes_str = str(row.get('Postes', ''))
-                users[uid] = {
-                    'password': str(row.get('Mot de passe', '')),
-                    'nom': nom,
-                    'initiales': row.get('Initiales', nom[:2].upper()),
-                    'droits': row.get('Droits', 'operateur'),
-                    'postes': [p.strip() for p in postes_str.split(',') if p.strip()]
-                }
-        return users if users else default
+        users = _load_users()
+        with _users_lock:
+            _users_cache['users'] = users
+            _users_cache['charge_le'] = time.monotonic()
     except Exception as e:
         print(f"Erreur utilisateurs: {e}")
-        return default
+    finally:
+        _users_cache['en_cours'] = False
+
+
+def get_users() -> dict:
+    """Annuaire en mémoire ; un annuaire périmé est servi pendant son rechargement"""
+    if _users_cache['users'] is None:
+        refresh_users()
+        if _users_cache['users'] is None:
+            return _default_users({})
+    elif time.monotonic() - _users_cache['charge_le'] > USERS_REFRESH_INTERVAL:
+        with _users_lock:
+            start = not _users_cache['en_cours']
+            _users_cache['en_cours'] = True
+        if start:
+            threading.Thread(target=refresh_users, name='utilisateurs', daemon=True).start()
+    return _users_cache['users']
 
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-def load_config() -> dict:
-    if CONFIG_FILE.exists():
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+# La config est gardée en mémoire et relue seulement quand config.json change
+# sur disque (mtime/taille). get_config() retourne l'objet partagé, en lecture
+# seule ; load_config() en retourne une copie que l'appelant peut modifier puis
+# passer à save_config(). L'écriture passe par un fichier temporaire
+# synchronisé puis renommé : une coupure de courant laisse soit l'ancien
+# fichier, soit le nouveau, jamais un fichier tronqué.
+
+_config_cache = None
+_config_snapshot = None  # copie sérialisée (marshal) pour des copies rapides
+_config_signature = None
+_config_lock = threading.RLock()
+
+
+def _config_file_signature():
+    try:
+        st = CONFIG_FILE.stat()
+        return (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+
+
+def _set_config_cache(config: dict, signature):
+    global _config_cache, _config_snapshot, _config_signature
+    _config_snapshot = marshal.dumps(config)
+    _config_cache = marshal.loads(_config_snapshot)
+    _config_signature = signature
+
+
+def get_config() -> dict:
+    """Config partagée, à ne pas modifier (voir load_config)"""
+    signature = _config_file_signature()
+    with _config_lock:
+        if signature is not None and signature != _config_signature:
+            try:
+                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
                 for key in ['printers', 'postes', 'tables']:
                     if key not in config:
                         config[key] = DEFAULT_CONFIG.get(key, [])
-                return config
-        except Exception as e:
-            print(f"Erreur config: {e}")
-    return DEFAULT_CONFIG.copy()
+                _set_config_cache(config, signature)
+            except Exception as e:
+                print(f"Erreur config: {e}")
+        if _config_cache is None:
+            _set_config_cache(DEFAULT_CONFIG, None)
+        return _config_cache
+
+
+def config_revision() -> str:
+    """Identifie la version de config.json servie par get_config()"""
+    get_config()
+    return '-'.join(map(str, _config_signature)) if _config_signature else 'defaut'
+
+
+def load_config() -> dict:
+    """Copie modifiable de la config"""
+    get_config()
+    return marshal.loads(_config_snapshot)
 
 
 def save_config(config: dict):
-    try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Erreur sauvegarde: {e}")
+    with _config_lock:
+        tmp = CONFIG_FILE.with_name(CONFIG_FILE.name + '.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, CONFIG_FILE)
+            dir_fd = os.open(CONFIG_FILE.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            _set_config_cache(config, _config_file_signature())
+        except Exception as e:
+            print(f"Erreur sauvegarde: {e}")
 
 
 def get_poste(config: dict, poste_id: str) -> dict:
@@ -995,21 +1947,152 @@ def get_printer(config: dict, printer_id: str) -> dict:
 # IMPRESSION ZPL
 # ============================================================================
 
-def send_zpl(zpl_code: str, printer: dict) -> dict:
-    ip = printer.get('ip', '192.168.1.67')
-    port = printer.get('port', 9100)
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.settimeout(10)
-            sock.connect((ip, port))
-            sock.sendall(zpl_code.encode('utf-8'))
-        return {'success': True, 'message': f'Envoyé à {ip}:{port}'}
-    except socket.timeout:
-        return {'success': False, 'message': 'Timeout connexion'}
-    except ConnectionRefusedError:
-        return {'success': False, 'message': 'Connexion refusée'}
-    except OSError as e:
-        return {'success': False, 'message': str(e)}
+# Un spooler par imprimante (ip, port) : une file de travaux, un thread, une
+# connexion TCP persistante réutilisée d'un travail à l'autre. La connexion
+# est refermée après PRINT_IDLE_TIMEOUT d'inactivité (les Zebra n'acceptent
+# qu'un client à la fois sur le port 9100) et rouverte à la demande.
+
+PRINT_CONNECT_TIMEOUT = 3
+PRINT_SOCKET_TIMEOUT = 10
+PRINT_IDLE_TIMEOUT = 60
+# Attente max d'un travail côté requête HTTP : couvre le pire cas d'un envoi (échec sur la
+# connexion réutilisée, reconnexion, nouvel envoi). Au-delà, le journal ou la remise des
+# numéros se font à la fin du travail (on_done), pas dans la requête.
+PRINT_WAIT_TIMEOUT = PRINT_CONNECT_TIMEOUT + 2 * PRINT_SOCKET_TIMEOUT + 2
+PRINT_JOBS_MAX = 200  # travaux conservés pour /api/print/jobs
+PRINT_BATCH_MAX = 200  # étiquettes par série
+
+_spoolers = {}
+_spoolers_lock = threading.Lock()
+_print_jobs = {}  # job_id -> job (ordre d'insertion)
+_print_jobs_lock = threading.Lock()
+
+
+class PrinterSpooler:
+    def __init__(self, ip: str, port: int):
+        self.ip = ip
+        self.port = port
+        self.queue = queue.Queue()
+        self.sock = None
+        self.derniere_erreur = None
+        self.thread = threading.Thread(target=self._run, name=f'spool-{ip}:{port}', daemon=True)
+        self.thread.start()
+
+    def status(self) -> dict:
+        return {'ip': self.ip, 'port': self.port, 'connecte': self.sock is not None,
+                'en_attente': self.queue.qsize(), 'derniere_erreur': self.derniere_erreur}
+
+    def _close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _connection(self) -> socket.socket:
+        if self.sock is not None:
+            # Connexion fermée par l'imprimante pendant l'inactivité ?
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if readable:
+                try:
+                    if not self.sock.recv(1024, socket.MSG_DONTWAIT):
+                        self._close()
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError:
+                    self._close()
+        if self.sock is None:
+            sock = socket.create_connection((self.ip, self.port), timeout=PRINT_CONNECT_TIMEOUT)
+            sock.settimeout(PRINT_SOCKET_TIMEOUT)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self.sock = sock
+        return self.sock
+
+    def _send(self, data: bytes):
+        """Envoie sur la connexion persistante. Un échec d'envoi sur une connexion réutilisée
+        (fermée par l'imprimante entre-temps) est retenté une fois sur une nouvelle connexion ;
+        un échec de connexion ne l'est pas."""
+        previous = self.sock
+        sock = self._connection()
+        try:
+            sock.sendall(data)
+        except OSError:
+            self._close()
+            if sock is not previous:
+                raise
+            self._connection().sendall(data)
+
+    def _run(self):
+        while True:
+            try:
+                job = self.queue.get(timeout=PRINT_IDLE_TIMEOUT)
+            except queue.Empty:
+                self._close()
+                continue
+            job['statut'] = 'en_cours'
+            try:
+                for _ in range(job['repetitions']):
+                    self._send(job['data'])
+                    job['envoyees'] += job['copies'] // job['repetitions']
+                job['statut'] = 'termine'
+                job['message'] = f'Envoyé à {self.ip}:{self.port}'
+                self.derniere_erreur = None
+            except socket.timeout:
+                self._fail(job, 'Timeout connexion')
+            except ConnectionRefusedError:
+                self._fail(job, 'Connexion refusée')
+            except OSError as e:
+                self._fail(job, str(e))
+            finally:
+                job['termine_le'] = time.time()
+                if job['on_done']:
+                    try:
+                        job['on_done'](job)
+                    except Exception as e:
+                        print(f"Erreur fin de travail {job['id']}: {e}")
+                job['done'].set()
+
+    def _fail(self, job: dict, message: str):
+        self._close()
+        job['statut'] = 'erreur'
+        job['message'] = message
+        self.derniere_erreur = message
+
+
+def get_spooler(printer: dict) -> PrinterSpooler:
+    key = (printer.get('ip', '192.168.1.67'), int(printer.get('port', 9100)))
+    with _spoolers_lock:
+        if key not in _spoolers:
+            _spoolers[key] = PrinterSpooler(*key)
+        return _spoolers[key]
+
+
+def submit_print_job(zpl_code, printer: dict, copies: int = 1, repetitions: int = 1, on_done=None) -> dict:
+    """Place un travail dans la file de l'imprimante et le retourne sans attendre.
+    copies = étiquettes produites par un envoi (^PQ), repetitions = nombre d'envois.
+    on_done(job) est appelé par le spooler à la fin du travail, réussi ou non."""
+    data = zpl_code.encode('utf-8') if isinstance(zpl_code, str) else zpl_code
+    job = {'id': uuid.uuid4().hex[:12], 'printer': printer.get('id', ''), 'statut': 'en_attente',
+           'copies': copies * repetitions, 'repetitions': repetitions, 'envoyees': 0, 'message': '', 'cree_le': time.time(), 'termine_le': None,
+           'data': data, 'done': threading.Event(), 'on_done': on_done}
+    with _print_jobs_lock:
+        _print_jobs[job['id']] = job
+        while len(_print_jobs) > PRINT_JOBS_MAX:
+            del _print_jobs[next(iter(_print_jobs))]
+    get_spooler(printer).queue.put(job)
+    return job
+
+
+def print_job_status(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k not in ('data', 'done', 'on_done')}
+
+
+def send_zpl(zpl_code, printer: dict) -> dict:
+    job = submit_print_job(zpl_code, printer)
+    if not job['done'].wait(PRINT_WAIT_TIMEOUT):
+        return {'success': False, 'message': "Pas de réponse de l'imprimante (travail en file d'attente)", 'job': job['id']}
+    return {'success': job['statut'] == 'termine', 'message': job['message'], 'job': job['id']}
 
 
 def format_numero(n: int, spaced: bool = True) -> str:
@@ -1017,54 +2100,130 @@ def format_numero(n: int, spaced: bool = True) -> str:
     return f"{s[0:2]} {s[2:4]} {s[4:6]}" if spaced else s
 
 
-def generate_zpl(poste: dict, data: dict, source: str = '') -> str:
-    serie = poste.get('serie', '2501')
-    compteur = poste.get('compteur', 0)
-    prefixe = poste.get('prefixe', '')
-    numero = format_numero(compteur)
-    qr_data = f"{prefixe}{serie}-{format_numero(compteur, spaced=False)}"
-    
-    lines = []
-    y = 180
-    
-    essence = data.get('essence', '')
-    if essence:
-        line = essence
-        if data.get('qualite'):
-            line += f" · {data['qualite']}"
-        if data.get('epaisseur'):
-            ep = data['epaisseur'].split('/')[0] if '/' in data['epaisseur'] else data['epaisseur']
-            line += f" · {ep}mm"
-        lines.append(f"^FO400,{y}^A0N,28,28^FD{line}^FS")
-        y += 35
-    
-    if source:
-        lines.append(f"^FO400,{y}^A0N,22,22^FDSource: {source}^FS")
-        y += 30
-    
-    for field in poste.get('champs', []):
-        value = data.get(field['id'], '')
-        if value:
-            lines.append(f"^FO400,{y}^A0N,22,22^FD{field['nom']}: {value}^FS")
-            y += 28
-    
-    champs_zpl = '\n'.join(lines)
-    
-    return f"""^XA
-^CI28
-^PW812
-^LL406
-^LH0,0
-~SD25
-^FO30,28
-^BQN,2,12
-^FDQA,{qr_data}^FS
-^FO400,30^A0N,36,36^FD{serie}^FS
-^FO400,80^A0N,80,80^FD{numero}^FS
-{champs_zpl}
-^FO400,360^A0N,24,24^FDMALLO BOIS^FS
-^FO30,370^A0N,18,18^FD{datetime.now().strftime('%d/%m/%Y')}^FS
-^XZ"""
+# Chaque mise en page de poste est compilée une fois en un ZplTemplate :
+# segments statiques déjà encodés en octets + emplacements variables (numéro
+# et QR, puis la suite : lignes d'informations, date, quantité). Le cache est indexé par poste et
+# invalidé dès que la signature (série, préfixe, champs) change.
+
+_zpl_templates = {}  # poste_id -> ZplTemplate
+_zpl_date = ['', b'']  # date du jour déjà encodée
+
+
+class ZplTemplate:
+    __slots__ = ('signature', 'qr_debut', 'numero_debut', 'numero_fin', 'pied', 'champs')
+
+    def __init__(self, poste: dict):
+        serie = str(poste.get('serie', '2501'))
+        prefixe = poste.get('prefixe', '')
+        self.signature = zpl_signature(poste)
+        self.qr_debut = f"^XA\n^CI28\n^PW812\n^LL406\n^LH0,0\n~SD25\n^FO30,28\n^BQN,2,12\n^FDQA,{prefixe}{serie}-".encode('utf-8')
+        self.numero_debut = f"^FS\n^FO400,30^A0N,36,36^FD{serie}^FS\n^FO400,80^A0N,80,80^FD".encode('utf-8')
+        self.numero_fin = b"^FS\n"
+        self.pied = b"\n^FO400,360^A0N,24,24^FDMALLO BOIS^FS\n^FO30,370^A0N,18,18^FD"
+        self.champs = [(f['id'], f"^A0N,22,22^FD{f['nom']}: ".encode('utf-8')) for f in poste.get('champs', [])]
+
+    def suite(self, data: dict, source: str = '', copies: int = 1) -> bytes:
+        """Tout ce qui suit le numéro (informations, pied, date, quantité) :
+        identique pour toutes les étiquettes d'une série, donc rendu une seule fois"""
+        lines = []
+        y = 180
+        essence = data.get('essence', '')
+        if essence:
+            line = essence
+            if data.get('qualite'):
+                line += f" · {data['qualite']}"
+            if data.get('epaisseur'):
+                ep = data['epaisseur'].split('/')[0] if '/' in data['epaisseur'] else data['epaisseur']
+                line += f" · {ep}mm"
+            lines.append(f"^FO400,{y}^A0N,28,28^FD{line}^FS".encode('utf-8'))
+            y += 35
+        if source:
+            lines.append(f"^FO400,{y}^A0N,22,22^FDSource: {source}^FS".encode('utf-8'))
+            y += 30
+        for field_id, prefix in self.champs:
+            value = data.get(field_id, '')
+            if value:
+                lines.append(b"^FO400,%d%s%s^FS" % (y, prefix, str(value).encode('utf-8')))
+                y += 28
+        return b''.join((self.numero_fin, b'\n'.join(lines), self.pied, zpl_date(), b"^FS\n", zpl_quantite(copies), b"^XZ"))
+
+    def render(self, compteur: int, suite: bytes) -> bytes:
+        s = b"%06d" % compteur
+        return b''.join((self.qr_debut, s, self.numero_debut, s[0:2], b' ', s[2:4], b' ', s[4:6], suite))
+
+
+def zpl_signature(poste: dict) -> tuple:
+    return (str(poste.get('serie', '2501')), poste.get('prefixe', ''),
+            tuple((f['id'], f['nom']) for f in poste.get('champs', [])))
+
+
+def get_zpl_template(poste: dict) -> ZplTemplate:
+    tpl = _zpl_templates.get(poste['id'])
+    if tpl is None or tpl.signature != zpl_signature(poste):
+        tpl = _zpl_templates[poste['id']] = ZplTemplate(poste)
+    return tpl
+
+
+def invalidate_zpl_template(poste_id: str):
+    _zpl_templates.pop(poste_id, None)
+
+
+def zpl_date() -> bytes:
+    today = datetime.now().strftime('%d/%m/%Y')
+    if _zpl_date[0] != today:
+        _zpl_date[:] = [today, today.encode()]
+    return _zpl_date[1]
+
+
+def zpl_quantite(copies: int) -> bytes:
+    """^PQ : l'imprimante produit elle-même les copies (sans pause entre étiquettes)"""
+    return b"^PQ%d,0,0,Y\n" % copies if copies > 1 else b''
+
+
+def generate_zpl(poste: dict, data: dict, source: str = '', copies: int = 1) -> bytes:
+    tpl = get_zpl_template(poste)
+    return tpl.render(poste.get('compteur', 0), tpl.suite(data, source, copies))
+
+
+def generate_zpl_serie(poste: dict, data: dict, source: str, debut: int, nombre: int, copies: int = 1, use_pq: bool = True) -> bytes:
+    """Étiquettes numérotées debut..debut+nombre-1, chacune en `copies` exemplaires (^PQ,
+    ou format répété si l'imprimante ne gère pas ^PQ), concaténées dans un seul travail :
+    une seule écriture réseau pour toute la série."""
+    tpl = get_zpl_template(poste)
+    suite = tpl.suite(data, source, copies if use_pq else 1)
+    labels = []
+    for i in range(nombre):
+        label = tpl.render((debut + i) % COMPTEUR_MAX, suite)
+        labels.extend([label] if use_pq else [label] * copies)
+    return b'\n'.join(labels)
+
+
+def printer_supports_pq(printer: dict) -> bool:
+    return printer.get('pq', True) is not False
+
+
+# ============================================================================
+# RÉPONSES CONDITIONNELLES
+# ============================================================================
+# Les GET de tables et de config portent un ETag tiré des révisions
+# (tables, config.json, compteurs) : le navigateur revalide avec
+# If-None-Match et reçoit un 304 sans corps si rien n'a changé. L'identifiant
+# de démarrage évite de réutiliser un ETag d'un process précédent.
+
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def conditional_json(etag: str, build, headers: dict = None):
+    """jsonify(build()) avec ETag, ou 304 si le client a déjà cette version"""
+    etag = f"{BOOT_ID}-{etag}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers.update(headers or {})
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 # ============================================================================
@@ -1078,7 +2237,7 @@ def login():
         username = data.get('username', '')
         password = data.get('password', '')
         users = get_users()
-        if username in users and users[username]['password'] == password:
+        if username in users and check_pin(users[username], password):
             session['user'] = username
             session['user_nom'] = users[username]['nom']
             session['user_droits'] = users[username].get('droits', 'operateur')
@@ -1097,7 +2256,7 @@ def logout():
 @app.route('/')
 @login_required
 def index():
-    config = load_config()
+    config = get_config()
     user_postes = session.get('user_postes', [])
     is_admin = session.get('user_droits') == 'admin'
     
@@ -1117,7 +2276,7 @@ def index():
 @app.route('/poste/<poste_id>')
 @login_required
 def page_poste(poste_id):
-    config = load_config()
+    config = get_config()
     poste = get_poste(config, poste_id)
     if not poste:
         return redirect(url_for('index'))
@@ -1129,6 +2288,8 @@ def page_poste(poste_id):
     if not is_admin and poste_id not in user_postes:
         return redirect(url_for('index'))
     
+    poste = {**poste, 'compteur': get_compteur(poste)}
+
     # Templates spécifiques par poste
     if poste_id == 'achats':
         return render_template('poste_achats.html', poste=poste)
@@ -1139,17 +2300,18 @@ def page_poste(poste_id):
 @app.route('/poste/<poste_id>/parametres')
 @admin_required
 def page_poste_params(poste_id):
-    config = load_config()
+    config = get_config()
     poste = get_poste(config, poste_id)
     if not poste:
         return redirect(url_for('index'))
+    poste = {**poste, 'compteur': get_compteur(poste)}
     return render_template('poste_parametres.html', poste=poste, printers=config.get('printers', []), all_postes=config.get('postes', []))
 
 
 @app.route('/poste/<poste_id>/liste')
 @admin_required
 def page_poste_liste(poste_id):
-    config = load_config()
+    config = get_config()
     poste = get_poste(config, poste_id)
     if not poste:
         return redirect(url_for('index'))
@@ -1159,7 +2321,7 @@ def page_poste_liste(poste_id):
 @app.route('/parametres')
 @admin_required
 def page_parametres():
-    return render_template('parametres.html', config=load_config())
+    return render_template('parametres.html', config=get_config())
 
 
 @app.route('/essences')
@@ -1186,8 +2348,6 @@ def api_get_users_full():
 
 @app.route('/api/users', methods=['POST'])
 def api_create_user():
-    if spreadsheet is None:
-        return jsonify({'success': False, 'message': 'Google Sheets non connecté'})
     data = request.json
     uid = data.get('id', '').strip().lower()
     password = data.get('password', '')
@@ -1198,9 +2358,10 @@ def api_create_user():
     if uid in get_users():
         return jsonify({'success': False, 'message': 'Identifiant déjà utilisé'})
     try:
-        sheet = spreadsheet.worksheet('Utilisateurs')
         postes_str = ','.join(data.get('postes', []))
-        sheet.append_row([uid, password, data['nom'], data['initiales'], data.get('droits', 'operateur'), postes_str])
+        row = [uid, password, data['nom'], data['initiales'], data.get('droits', 'operateur'), postes_str]
+        write_sheet_row('Utilisateurs', 'append', uid, row)
+        refresh_users()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -1208,43 +2369,33 @@ def api_create_user():
 
 @app.route('/api/users', methods=['PUT'])
 def api_update_user():
-    if spreadsheet is None:
-        return jsonify({'success': False, 'message': 'Google Sheets non connecté'})
     data = request.json
     uid = data.get('id', '').strip()
     password = data.get('password', '')
     if password and (len(password) < 6 or len(password) > 8 or not password.isdigit()):
         return jsonify({'success': False, 'message': 'PIN: 6 à 8 chiffres'})
     try:
-        sheet = spreadsheet.worksheet('Utilisateurs')
-        records = sheet.get_all_records()
-        for i, row in enumerate(records):
-            if str(row.get('Identifiant', '')).lower() == uid.lower():
-                row_num = i + 2
-                sheet.update_cell(row_num, 3, data.get('nom', ''))
-                sheet.update_cell(row_num, 4, data.get('initiales', ''))
-                sheet.update_cell(row_num, 5, data.get('droits', 'operateur'))
-                sheet.update_cell(row_num, 6, ','.join(data.get('postes', [])))
-                if password:
-                    sheet.update_cell(row_num, 2, password)
-                return jsonify({'success': True})
-        return jsonify({'success': False, 'message': 'Utilisateur non trouvé'})
+        values = [data.get('nom', ''), data.get('initiales', ''), data.get('droits', 'operateur'), ','.join(data.get('postes', []))]
+        # Colonnes B (mot de passe) à F, ou C à F si le PIN n'est pas modifié
+        if password:
+            found = write_sheet_row('Utilisateurs', 'update', uid.lower(), [password] + values, 2)
+        else:
+            found = write_sheet_row('Utilisateurs', 'update', uid.lower(), values, 3)
+        if not found:
+            return jsonify({'success': False, 'message': 'Utilisateur non trouvé'})
+        refresh_users()
+        return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 
 @app.route('/api/users/<uid>', methods=['DELETE'])
 def api_delete_user(uid):
-    if spreadsheet is None:
-        return jsonify({'success': False, 'message': 'Google Sheets non connecté'})
     try:
-        sheet = spreadsheet.worksheet('Utilisateurs')
-        records = sheet.get_all_records()
-        for i, row in enumerate(records):
-            if str(row.get('Identifiant', '')).lower() == uid.lower():
-                sheet.delete_rows(i + 2)
-                return jsonify({'success': True})
-        return jsonify({'success': False, 'message': 'Non trouvé'})
+        if not write_sheet_row('Utilisateurs', 'delete', uid.lower()):
+            return jsonify({'success': False, 'message': 'Non trouvé'})
+        refresh_users()
+        return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -1255,7 +2406,7 @@ def api_delete_user(uid):
 
 @app.route('/api/printers', methods=['GET'])
 def api_get_printers():
-    return jsonify(load_config().get('printers', []))
+    return conditional_json(f"c{config_revision()}", lambda: get_config().get('printers', []))
 
 
 @app.route('/api/printers', methods=['POST'])
@@ -1267,7 +2418,7 @@ def api_create_printer():
     pid = data.get('id', '').strip().lower()
     if any(p['id'] == pid for p in config.get('printers', [])):
         return jsonify({'success': False, 'message': 'ID déjà utilisé'})
-    config['printers'].append({'id': pid, 'nom': data.get('nom', '').strip(), 'ip': data.get('ip', '').strip(), 'port': int(data.get('port', 9100))})
+    config['printers'].append({'id': pid, 'nom': data.get('nom', '').strip(), 'ip': data.get('ip', '').strip(), 'port': int(data.get('port', 9100)), 'pq': bool(data.get('pq', True))})
     save_config(config)
     return jsonify({'success': True})
 
@@ -1281,6 +2432,8 @@ def api_update_printer():
             p.update({k: data[k] for k in ['nom', 'ip'] if k in data})
             if 'port' in data:
                 p['port'] = int(data['port'])
+            if 'pq' in data:
+                p['pq'] = bool(data['pq'])
             save_config(config)
             return jsonify({'success': True})
     return jsonify({'success': False, 'message': 'Non trouvée'})
@@ -1298,19 +2451,41 @@ def api_delete_printer(pid):
 
 @app.route('/api/printers/<pid>/test', methods=['POST'])
 def api_test_printer(pid):
-    config = load_config()
+    config = get_config()
     printer = get_printer(config, pid)
     test_zpl = f"^XA^CI28^PW812^LL203^FO50,30^A0N,40,40^FDTEST {printer.get('nom', 'Imprimante')}^FS^FO50,80^A0N,25,25^FDMALLO BOIS - WoodStock^FS^FO50,120^A0N,20,20^FD{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}^FS^FO50,160^A0N,18,18^FDIP: {printer.get('ip')}:{printer.get('port')}^FS^XZ"
     return jsonify(send_zpl(test_zpl, printer))
 
 
+@app.route('/api/printers/<pid>/status', methods=['GET'])
+def api_printer_status(pid):
+    printer = get_printer(get_config(), pid)
+    return jsonify(get_spooler(printer).status())
+
+
+@app.route('/api/print/jobs', methods=['GET'])
+def api_print_jobs():
+    with _print_jobs_lock:
+        jobs = list(_print_jobs.values())
+    return jsonify([print_job_status(j) for j in reversed(jobs)])
+
+
+@app.route('/api/print/jobs/<job_id>', methods=['GET'])
+def api_print_job(job_id):
+    job = _print_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Travail inconnu'})
+    return jsonify(print_job_status(job))
+
+
 # ============================================================================
 # API POSTES
 # ============================================================================
 
 @app.route('/api/postes', methods=['GET'])
 def api_get_postes():
-    return jsonify(load_config().get('postes', []))
+    etag = f"c{config_revision()}-n{_compteurs_revision}"
+    return conditional_json(etag, lambda: with_compteurs(get_config().get('postes', [])))
 
 
 @app.route('/api/postes', methods=['POST'])
@@ -1322,6 +2497,7 @@ def api_create_poste():
         return jsonify({'success': False, 'message': 'ID requis'})
     if any(p['id'] == pid for p in config.get('postes', [])):
         return jsonify({'success': False, 'message': 'ID déjà utilisé'})
+    set_compteur(pid, 0)
     config['postes'].append({'id': pid, 'nom': data.get('nom', pid), 'description': data.get('description', ''), 'serie': data.get('serie', '2501'), 'compteur': 0, 'prefixe': data.get('prefixe', ''), 'printer': data.get('printer', config['printers'][0]['id'] if config['printers'] else 'zebra1'), 'copies_defaut': int(data.get('copies_defaut', 1)), 'champs': data.get('champs', [])})
     save_config(config)
     return jsonify({'success': True})
@@ -1339,10 +2515,12 @@ def api_update_poste(poste_id):
             if 'copies_defaut' in data:
                 p['copies_defaut'] = int(data['copies_defaut'])
             if 'compteur' in data:
-                p['compteur'] = int(data['compteur']) % 1000000
+                p['compteur'] = int(data['compteur']) % COMPTEUR_MAX
+                set_compteur(poste_id, p['compteur'])
             if 'champs' in data:
                 p['champs'] = data['champs']
             save_config(config)
+            invalidate_zpl_template(poste_id)
             return jsonify({'success': True})
     return jsonify({'success': False, 'message': 'Non trouvé'})
 
@@ -1354,6 +2532,8 @@ def api_delete_poste(poste_id):
         return jsonify({'success': False, 'message': 'Au moins un poste requis'})
     config['postes'] = [p for p in config['postes'] if p['id'] != poste_id]
     save_config(config)
+    delete_compteur(poste_id)
+    invalidate_zpl_template(poste_id)
     return jsonify({'success': True})
 
 
@@ -1363,7 +2543,7 @@ def api_delete_poste(poste_id):
 
 @app.route('/api/tables', methods=['GET'])
 def api_get_tables():
-    return jsonify(load_config().get('tables', []))
+    return jsonify(get_config().get('tables', []))
 
 
 @app.route('/api/tables', methods=['POST'])
@@ -1394,6 +2574,7 @@ def api_update_table(table_id):
             if 'colonnes' in data:
                 t['colonnes'] = data['colonnes']
             save_config(config)
+            invalidate_table_cache(table_id)
             return jsonify({'success': True})
     return jsonify({'success': False, 'message': 'Non trouvée'})
 
@@ -1403,21 +2584,33 @@ def api_delete_table(table_id):
     config = load_config()
     config['tables'] = [t for t in config.get('tables', []) if t['id'] != table_id]
     save_config(config)
+    invalidate_table_cache(table_id)
     return jsonify({'success': True})
 
 
 @app.route('/api/tables/<table_id>/values', methods=['GET'])
 def api_get_table_values(table_id):
-    config = load_config()
+    config = get_config()
+    table_cfg = next((t for t in config.get('tables', []) if t['id'] == table_id), None)
+    # Révision lue avant les données : au pire un client reçoit plus récent que son ETag, jamais l'inverse
+    etag = f"t{table_revision(table_id)}"
+    state = table_change_log(table_id, table_cfg)
+    records = state['source']
+    # Révision du journal des modifications, point de départ de /changes
+    headers = {'X-Table-Revision': f"{BOOT_ID}.{state['revision']}"}
+    return conditional_json(etag, lambda: records, headers)
+
+
+@app.route('/api/tables/<table_id>/changes', methods=['GET'])
+def api_get_table_changes(table_id):
+    config = get_config()
     table_cfg = next((t for t in config.get('tables', []) if t['id'] == table_id), None)
-    if table_cfg:
-        get_or_create_table_sheet(table_id, table_cfg)
-    return jsonify(get_table_values(table_id, table_cfg))
+    return jsonify(table_changes(table_id, request.args.get('since', ''), table_cfg))
 
 
 @app.route('/api/tables/<table_id>/values', methods=['POST'])
 def api_add_table_value(table_id):
-    config = load_config()
+    config = get_config()
     table_cfg = next((t for t in config.get('tables', []) if t['id'] == table_id), None)
     if not table_cfg:
         return jsonify({'success': False, 'message': 'Table non trouvée'})
@@ -1425,9 +2618,38 @@ def api_add_table_value(table_id):
     return jsonify({'success': add_table_value(table_id, table_cfg, request.json)})
 
 
+@app.route('/api/tables/<table_id>/values/bulk', methods=['POST'])
+def api_bulk_table_values(table_id):
+    config = get_config()
+    table_cfg = next((t for t in config.get('tables', []) if t['id'] == table_id), None)
+    if not table_cfg:
+        return jsonify({'success': False, 'message': 'Table non trouvée'})
+    rows = request.json
+    if isinstance(rows, dict):
+        rows = rows.get('rows')
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        return jsonify({'success': False, 'message': 'Liste de lignes attendue'})
+    try:
+        if spreadsheet is not None:
+            get_or_create_table_sheet(table_id, table_cfg)
+        return jsonify({'success': True, **bulk_upsert_table_values(table_id, table_cfg, rows)})
+    except Exception as e:
+        print(f"Erreur import table {table_id}: {e}")
+        return jsonify({'success': False, 'message': str(e)})
+
+
+@app.route('/api/references/reconcile', methods=['POST'])
+@admin_required
+def api_reconcile_references():
+    bilan = reconcile_reference_tables()
+    if bilan is None:
+        return jsonify({'success': False, 'message': _reference_state['derniere_erreur'] or 'Google Sheets non disponible'})
+    return jsonify({'success': True, 'tables': bilan})
+
+
 @app.route('/api/tables/<table_id>/values/<int:row_id>', methods=['PUT'])
 def api_update_table_value(table_id, row_id):
-    config = load_config()
+    config = get_config()
     table_cfg = next((t for t in config.get('tables', []) if t['id'] == table_id), None)
     if not table_cfg:
         return jsonify({'success': False, 'message': 'Table non trouvée'})
@@ -1441,16 +2663,47 @@ def api_delete_table_value(table_id, row_id):
 
 @app.route('/api/qualites/<essence_code>/<produit_code>', methods=['GET'])
 def api_get_qualites_filtrees(essence_code, produit_code):
-    all_qualites = get_table_values('qualites')
-    filtered = [q for q in all_qualites if q.get('Essence', '').upper() == essence_code.upper() and q.get('Produit', '').upper() == produit_code.upper()]
-    return jsonify(filtered)
+    index = get_table_index('qualites', ('Essence', 'Produit'))
+    return jsonify(index.get((essence_code.upper(), produit_code.upper()), []))
 
 
 @app.route('/api/epaisseurs/<essence_code>', methods=['GET'])
 def api_get_epaisseurs_filtrees(essence_code):
-    all_ep = get_table_values('epaisseurs')
-    filtered = [e for e in all_ep if e.get('Essence', '').upper() == essence_code.upper()]
-    return jsonify(filtered)
+    index = get_table_index('epaisseurs', ('Essence',))
+    return jsonify(index.get((essence_code.upper(),), []))
+
+
+def _args_nombres(name: str, default: tuple, mini: float, maxi: float) -> tuple:
+    """Liste de nombres passée en ?name=8,10 ou ?name=8&name=10"""
+    texte = ','.join(request.args.getlist(name))
+    if not texte:
+        return default
+    message = f"{name}: 1 à 20 valeurs entre {mini:g} et {maxi:g}"
+    try:
+        valeurs = tuple(float(v.replace(' ', '')) for v in texte.split(',') if v.strip())
+    except ValueError:
+        raise ValueError(message)
+    if not valeurs or len(valeurs) > 20 or any(not mini <= v <= maxi for v in valeurs):
+        raise ValueError(message)
+    return tuple(int(v) if v.is_integer() else v for v in valeurs)
+
+
+@app.route('/api/epaisseurs/calcul', methods=['GET'])
+def api_calcul_epaisseurs():
+    """Épaisseurs frais pour des humidités cibles et épaisseurs sèches au choix"""
+    try:
+        humidites = _args_nombres('humidite', HUMIDITES_SECHOIR, 0, 30)
+        ep_secs = _args_nombres('ep_sec', EPAISSEURS_CIBLES, 1, 500)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    codes = None
+    if request.args.get('essence'):
+        codes = [c.strip().upper() for c in request.args['essence'].split(',') if c.strip()]
+        inconnues = [c for c in codes if c not in ESSENCES]
+        if inconnues:
+            return jsonify({'success': False, 'message': f"Essence inconnue: {', '.join(inconnues)}"})
+    return jsonify({'success': True, 'humidites': humidites, 'ep_secs': ep_secs,
+                    'epaisseurs': calcul_epaisseurs.lignes(humidites, ep_secs, codes)})
 
 
 # ============================================================================
@@ -1459,7 +2712,7 @@ def api_get_epaisseurs_filtrees(essence_code):
 
 @app.route('/api/print/<poste_id>', methods=['POST'])
 def api_print(poste_id):
-    config = load_config()
+    config = get_config()
     poste = get_poste(config, poste_id)
     if not poste:
         return jsonify({'success': False, 'message': 'Poste non trouvé'})
@@ -1467,28 +2720,91 @@ def api_print(poste_id):
     imprimer = data.get('imprimer', True)
     copies = min(max(int(data.get('copies', poste.get('copies_defaut', 1))), 0), 50)
     source = data.get('source', '')
-    numero_imprime = format_numero(poste['compteur'])
-    zpl = generate_zpl(poste, data, source)
+    numero = reserve_numeros(poste)
+    poste = {**poste, 'compteur': numero}
+    numero_imprime = format_numero(numero)
+    printer = get_printer(config, poste.get('printer', 'zebra1'))
+    # Avec ^PQ, un seul envoi pour toutes les copies ; sinon on renvoie l'étiquette par copie
+    use_pq = printer_supports_pq(printer)
+    zpl = generate_zpl(poste, data, source, copies if use_pq else 1)
+    log_data = {**data, 'numero': format_numero(numero, spaced=False), 'source': source}
+    operateur = session.get('user_nom', 'Inconnu')
+
+    def terminer(job):
+        """Fin du travail : journal si au moins une copie est partie, sinon le numéro est rendu"""
+        if job and job['envoyees'] == 0:
+            release_numeros(poste, numero)
+        else:
+            log_to_poste_sheet(poste_id, poste, log_data, copies if imprimer else 0, operateur)
+
+    if not (imprimer and copies > 0):
+        terminer(None)
+        return jsonify({'success': True, 'message': f'N° {numero_imprime}', 'compteur': (numero + 1) % COMPTEUR_MAX, 'numero_imprime': numero_imprime, 'job': None})
+    if use_pq:
+        job = submit_print_job(zpl, printer, copies=copies, on_done=terminer)
+    else:
+        job = submit_print_job(zpl, printer, repetitions=copies, on_done=terminer)
+    if not job['done'].wait(PRINT_WAIT_TIMEOUT):
+        # Pas encore imprimé : journal ou remise du numéro à la fin du travail
+        return jsonify({'success': False, 'en_attente': True, 'message': f"N° {numero_imprime} en file d'attente, imprimante lente ou injoignable",
+                        'compteur': get_compteur(poste), 'job': job['id']})
+    printed = job['envoyees']
+    if printed == 0:
+        return jsonify({'success': False, 'message': job['message'] or 'Erreur impression', 'compteur': get_compteur(poste), 'job': job['id']})
+    message = f'N° {numero_imprime}' + (f' ({printed} copies)' if printed > 1 else '')
+    return jsonify({'success': True, 'message': message, 'compteur': (numero + 1) % COMPTEUR_MAX, 'numero_imprime': numero_imprime, 'job': job['id']})
+
+
+@app.route('/api/print/<poste_id>/batch', methods=['POST'])
+def api_print_batch(poste_id):
+    """Série de `nombre` étiquettes consécutives : une réservation de numéros, un rendu,
+    un seul travail d'impression et une seule transaction de journal."""
+    config = get_config()
+    poste = get_poste(config, poste_id)
+    if not poste:
+        return jsonify({'success': False, 'message': 'Poste non trouvé'})
+    data = request.json or {}
+    try:
+        nombre = min(max(int(data.get('nombre', 1)), 1), PRINT_BATCH_MAX)
+        copies = min(max(int(data.get('copies', poste.get('copies_defaut', 1))), 0), 50)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Nombre et copies: entiers attendus'})
+    imprimer = data.get('imprimer', True)
+    source = data.get('source', '')
+    debut = reserve_numeros(poste, nombre)
+    numeros = [(debut + i) % COMPTEUR_MAX for i in range(nombre)]
     printer = get_printer(config, poste.get('printer', 'zebra1'))
-    printed = 0
-    result = {'success': True}
+    operateur = session.get('user_nom', 'Inconnu')
+    premier, dernier = format_numero(numeros[0]), format_numero(numeros[-1])
+
+    def terminer(job):
+        """Fin du travail : la série est journalisée si au moins une étiquette est partie,
+        sinon la plage réservée est rendue"""
+        if job and job['envoyees'] == 0:
+            release_numeros(poste, debut, nombre)
+            return
+        now = datetime.now()
+        rows = [poste_row(poste, {**data, 'numero': format_numero(n, spaced=False), 'source': source}, copies if imprimer else 0, operateur, now)
+                for n in numeros]
+        log_rows_to_poste_sheet(poste_id, poste, rows)
+
+    job = None
     if imprimer and copies > 0:
-        for _ in range(copies):
-            result = send_zpl(zpl, printer)
-            if result['success']:
-                printed += 1
-            else:
-                break
-        if printed == 0:
-            return jsonify({'success': False, 'message': result.get('message', 'Erreur impression'), 'compteur': poste['compteur']})
-    log_data = {**data, 'numero': format_numero(poste['compteur'], spaced=False), 'source': source}
-    log_to_poste_sheet(poste_id, poste, log_data, copies if imprimer else 0, session.get('user_nom', 'Inconnu'))
-    for p in config['postes']:
-        if p['id'] == poste_id:
-            p['compteur'] = (p['compteur'] + 1) % 1000000
-            break
-    save_config(config)
-    return jsonify({'success': True, 'message': f'N° {numero_imprime}' + (f' ({printed} copies)' if printed > 1 else ''), 'compteur': poste['compteur'] + 1, 'numero_imprime': numero_imprime})
+        zpl = generate_zpl_serie(poste, data, source, debut, nombre, copies, printer_supports_pq(printer))
+        job = submit_print_job(zpl, printer, copies=nombre * copies, on_done=terminer)
+        if not job['done'].wait(PRINT_WAIT_TIMEOUT):
+            # Pas encore imprimée : journal ou remise de la plage à la fin du travail
+            return jsonify({'success': False, 'en_attente': True,
+                            'message': f"N° {premier} → {dernier} en file d'attente, imprimante lente ou injoignable",
+                            'compteur': get_compteur(poste), 'job': job['id']})
+        if job['envoyees'] == 0:
+            return jsonify({'success': False, 'message': job['message'] or 'Erreur impression', 'compteur': get_compteur(poste), 'job': job['id']})
+    else:
+        terminer(None)
+    message = f'N° {premier} → {dernier} ({nombre} étiquettes)'
+    return jsonify({'success': True, 'message': message, 'compteur': (numeros[-1] + 1) % COMPTEUR_MAX,
+                    'premier': premier, 'dernier': dernier, 'nombre': nombre, 'copies_imprimees': job['envoyees'] if job else 0,
+                    'job': job['id'] if job else None})
 
 
 @app.route('/api/poste/<poste_id>/history', methods=['GET'])
@@ -1496,8 +2812,8 @@ def api_poste_history(poste_id):
     return jsonify(get_poste_history(poste_id))
 
 
-@app.route('/api/poste/<poste_id>/series', methods=['GET'])
-def api_poste_series(poste_id):
+def poste_series(poste_id: str) -> dict:
+    """Numéros récents du poste, groupés par série"""
     history = get_poste_history(poste_id, limit=500)
     series = {}
     for row in history:
@@ -1509,7 +2825,47 @@ def api_poste_series(poste_id):
                 series[serie].append(numero)
     for s in series:
         series[s].sort()
-    return jsonify(series)
+    return series
+
+
+@app.route('/api/poste/<poste_id>/series', methods=['GET'])
+def api_poste_series(poste_id):
+    return jsonify(poste_series(poste_id))
+
+
+# Les morceaux du bootstrap sont lus en parallèle : tables en mémoire ou dans
+# le miroir en temps normal, mais une lecture Sheets à froid ne bloque pas les autres.
+_bootstrap_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='bootstrap')
+
+
+def _par_essence(table_id: str, produit: str = None) -> dict:
+    """{code essence: lignes} pour les épaisseurs, ou les qualités d'un produit"""
+    if produit is None:
+        return {k[0]: rows for k, rows in get_table_index(table_id, ('Essence',)).items()}
+    return {k[0]: rows for k, rows in get_table_index(table_id, ('Essence', 'Produit')).items() if k[1] == produit}
+
+
+@app.route('/api/poste/<poste_id>/bootstrap', methods=['GET'])
+def api_poste_bootstrap(poste_id):
+    """Tout ce dont la page d'un poste a besoin, en une seule réponse"""
+    config = get_config()
+    poste = get_poste(config, poste_id)
+    if not poste:
+        return jsonify({'success': False, 'message': 'Poste non trouvé'})
+    printer = get_printer(config, poste.get('printer', 'zebra1'))
+    tasks = {
+        'compteur': (get_compteur, poste),
+        'imprimante': (get_spooler(printer).status,)
+    }
+    type_produit = str(poste.get('type_produit') or '').upper()
+    if type_produit:
+        tasks['essences'] = (get_table_values, 'essences')
+        tasks['qualites'] = (_par_essence, 'qualites', type_produit)
+        tasks['epaisseurs'] = (_par_essence, 'epaisseurs')
+    if poste.get('source_poste'):
+        tasks['series'] = (poste_series, poste['source_poste'])
+    futures = {key: _bootstrap_executor.submit(*task) for key, task in tasks.items()}
+    return jsonify({'success': True, **{key: f.result() for key, f in futures.items()}})
 
 
 # ============================================================================
@@ -1518,7 +2874,83 @@ def api_poste_series(poste_id):
 
 @app.route('/api/config', methods=['GET'])
 def api_get_config():
-    return jsonify(load_config())
+    etag = f"c{config_revision()}-n{_compteurs_revision}"
+    config = get_config()
+    return conditional_json(etag, lambda: {**config, 'postes': with_compteurs(config.get('postes', []))})
+
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """Flux SSE ; ?postes=a,b limite les impressions et compteurs à ces postes"""
+    postes = {p for p in request.args.get('postes', '').split(',') if p}
+    q = subscribe_events()
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event, data = q.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                if event is None:
+                    break
+                if postes and 'poste_id' in data and data['poste_id'] not in postes:
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            unsubscribe_events(q)
+
+    return app.response_class(stream(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/health', methods=['GET'])
+def api_health():
+    """Le process répond ; l'état de l'initialisation est donné à titre indicatif"""
+    return jsonify({
+        'statut': 'ok',
+        'google_sheets': spreadsheet is not None,
+        'demarrage': startup_status()
+    })
+
+
+@app.route('/api/ready', methods=['GET'])
+def api_ready():
+    """503 tant que l'initialisation en arrière-plan n'est pas terminée"""
+    state = startup_status()
+    return jsonify(state), 200 if state['pret'] else 503
+
+
+@app.route('/api/journal/status', methods=['GET'])
+def api_journal_status():
+    return jsonify(journal_status())
+
+
+@app.route('/api/sync/status', methods=['GET'])
+def api_sync_status():
+    journal = journal_status()
+    operations = operations_status()
+    return jsonify({
+        'hors_ligne': spreadsheet is None or _mirror_state['en_ligne'] is False,
+        'en_attente': journal['en_attente'] + operations['en_attente'],
+        'journal': journal,
+        'operations': operations,
+        'miroir': mirror_status(),
+        'references': _reference_state
+    })
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    return jsonify({**table_cache_stats(), 'worksheets': worksheets_status()})
+
+
+@app.route('/api/cache/clear', methods=['POST'])
+def api_cache_clear():
+    invalidate_table_cache()
+    return jsonify({'success': True})
 
 
 @app.route('/api/update', methods=['POST'])
@@ -1541,8 +2973,81 @@ def api_update():
 if not CONFIG_FILE.exists():
     save_config(DEFAULT_CONFIG)
 
-init_google_sheets()
-init_reference_tables()
+init_local_db()
+
+# L'import du module ne fait que du local (config, base SQLite) : le serveur
+# répond tout de suite, depuis le miroir. La connexion à Google Sheets et la
+# synchronisation des tables de référence tournent dans un thread démarré avec
+# les workers ; /api/health et /api/ready exposent leur avancement.
+
+STARTUP_RETRY_MAX_DELAY = 300  # secondes
+
+_workers_lock = threading.Lock()
+_workers_demarres = False
+_startup_state = {
+    'etape': 'en attente',  # en attente, connexion, tables, terminé, sans credentials
+    'pret': False,
+    'tentatives': 0,
+    'debut': None,
+    'fin': None,
+    'derniere_erreur': None
+}
+
+
+def _startup_worker():
+    _startup_state['debut'] = time.time()
+    if not CREDENTIALS_FILE.exists():
+        print("⚠ credentials.json non trouvé")
+        _startup_state.update(etape='sans credentials', pret=True, fin=time.time())
+        return
+    # Connexion : retentée avec backoff tant que Sheets est injoignable
+    _startup_state['etape'] = 'connexion'
+    delay = JOURNAL_FLUSH_INTERVAL
+    while True:
+        _startup_state['tentatives'] += 1
+        if init_google_sheets():
+            break
+        _startup_state['derniere_erreur'] = datetime.now().isoformat(timespec='seconds')
+        time.sleep(delay)
+        delay = min(delay * 2, STARTUP_RETRY_MAX_DELAY)
+    refresh_users()
+    _mirror_event.set()
+    _journal_event.set()
+    _startup_state['etape'] = 'tables'
+    if reconcile_reference_tables() is None:
+        _startup_state['derniere_erreur'] = datetime.now().isoformat(timespec='seconds')
+    _startup_state.update(etape='terminé', pret=True, fin=time.time())
+    duree = _startup_state['fin'] - _startup_state['debut']
+    print(f"✓ Initialisation terminée en {duree:.1f} s")
+    _reference_worker()
+
+
+def startup_status() -> dict:
+    state = dict(_startup_state)
+    for key in ('debut', 'fin'):
+        if state[key]:
+            state[key] = datetime.fromtimestamp(state[key]).isoformat(timespec='seconds')
+    return state
+
+
+def start_workers():
+    """Démarre une seule fois les threads d'arrière-plan (démarrage, journal, miroir)"""
+    global _workers_demarres
+    if _workers_demarres:
+        return
+    with _workers_lock:
+        if not _workers_demarres:
+            threading.Thread(target=_startup_worker, name='demarrage', daemon=True).start()
+            threading.Thread(target=_journal_worker, name='journal', daemon=True).start()
+            threading.Thread(target=_mirror_worker, name='miroir', daemon=True).start()
+            _workers_demarres = True
+
+
+@app.before_request
+def demarrer_workers():
+    """Filet de sécurité pour un serveur WSGI : python app.py démarre les workers dès le
+    lancement, ici ils démarrent au premier appel."""
+    start_workers()
 
 if __name__ == '__main__':
     print("\n" + "=" * 50)
@@ -1551,15 +3056,22 @@ if __name__ == '__main__':
     _afficher_tableau_epaisseurs()
     
     PORT = 5001
-    
-    if os.path.exists('cert.pem') and os.path.exists('key.pem'):
+    HTTPS = os.path.exists('cert.pem') and os.path.exists('key.pem')
+    DEBUG = not HTTPS
+
+    # Workers lancés sans attendre une première requête : avec le reloader (debug),
+    # seulement dans le process enfant qui sert les requêtes
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_workers()
+
+    if HTTPS:
         import ssl
         context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         context.load_cert_chain('cert.pem', 'key.pem')
         print(f"  🔒 https://localhost:{PORT}")
         print("=" * 50)
-        app.run(host='0.0.0.0', port=PORT, debug=False, ssl_context=context)
+        app.run(host='0.0.0.0', port=PORT, debug=DEBUG, ssl_context=context)
     else:
         print(f"  http://localhost:{PORT}")
         print("=" * 50)
-        app.run(host='0.0.0.0', port=PORT, debug=True)
+        app.run(host='0.0.0.0', port=PORT, debug=DEBUG)
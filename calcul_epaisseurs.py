@@ -0,0 +1,77 @@
+# ============================================================================
+# CALCUL DES ÉPAISSEURS DE SCIAGE
+# ============================================================================
+# Épaisseur à scier en frais pour obtenir une épaisseur sèche donnée à une
+# humidité cible de séchoir (standard 8%, jusqu'à 15% pour certains usages).
+# Formule: retrait_effectif = retrait × (PSF - H_cible) / PSF
+#          ep_frais = ep_sec / (1 - retrait_effectif)
+# Le retrait tangentiel (débit sur dosse) donne l'épaisseur de référence ;
+# le retrait radial (débit sur quartier) est fourni à titre indicatif.
+# Toute la grille essence × humidité × épaisseur est calculée en une passe.
+
+import threading
+
+import numpy as np
+
+HUMIDITE_CIBLE = 8  # %
+HUMIDITES_SECHOIR = (8, 10, 12, 15)  # %
+EPAISSEURS_CIBLES = (18, 27, 32, 45, 50, 80)  # mm sec
+
+CACHE_MAX = 256  # grilles mémorisées
+
+
+class CalculEpaisseurs:
+    def __init__(self, registre):
+        """registre : RegistreEssences (essences_data.ESSENCES), lu colonne par colonne"""
+        self.registre = registre
+        self.codes = registre.codes
+        self.psf = np.array(registre.colonne('psf'), dtype=float)
+        self.retrait_t = np.array(registre.colonne('retrait_t'), dtype=float) / 100
+        self.retrait_r = np.array([r or 0 for r in registre.colonne('retrait_r')], dtype=float) / 100
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _retrait_effectif(self, retrait: np.ndarray, humidites: np.ndarray) -> np.ndarray:
+        """Essence × humidité ; aucun retrait au-dessus du PSF"""
+        psf = self.psf[:, None]
+        return retrait[:, None] * np.clip(psf - humidites[None, :], 0, None) / psf
+
+    def grille(self, humidites: tuple = (HUMIDITE_CIBLE,), ep_secs: tuple = EPAISSEURS_CIBLES) -> dict:
+        """Épaisseurs frais arrondies au mm, tableaux essence × humidité × épaisseur sèche.
+        Le résultat est partagé par le cache : ne pas le modifier."""
+        key = (tuple(humidites), tuple(ep_secs))
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+        h = np.asarray(key[0], dtype=float)
+        ep = np.asarray(key[1], dtype=float)[None, None, :]
+        result = {
+            'tangentiel': np.rint(ep / (1 - self._retrait_effectif(self.retrait_t, h)[:, :, None])).astype(int),
+            'radial': np.rint(ep / (1 - self._retrait_effectif(self.retrait_r, h)[:, :, None])).astype(int),
+        }
+        for arr in result.values():
+            arr.flags.writeable = False
+        with self._lock:
+            if len(self._cache) >= CACHE_MAX:
+                self._cache.clear()
+            self._cache[key] = result
+        return result
+
+    def lignes(self, humidites: tuple = (HUMIDITE_CIBLE,), ep_secs: tuple = EPAISSEURS_CIBLES, codes: list = None) -> list:
+        """Grille à plat, une ligne par essence × humidité × épaisseur sèche"""
+        grille = self.grille(humidites, ep_secs)
+        tangentiel, radial = grille['tangentiel'].tolist(), grille['radial'].tolist()
+        indices = [self.registre.index(c) for c in codes] if codes is not None else range(len(self.codes))
+        return [
+            {'essence': self.codes[i], 'humidite': h, 'ep_sec': ep_sec,
+             'ep_frais': tangentiel[i][j][k], 'ep_frais_radial': radial[i][j][k]}
+            for i in indices
+            for j, h in enumerate(humidites)
+            for k, ep_sec in enumerate(ep_secs)
+        ]
+
+    def reference(self) -> list:
+        """Lignes de la table de référence des épaisseurs (humidité et épaisseurs cibles) :
+        source unique pour l'application et import_epaisseurs.py"""
+        return [{'essence': e['essence'], 'ep_frais': e['ep_frais'], 'ep_sec': e['ep_sec']}
+                for e in self.lignes((HUMIDITE_CIBLE,), EPAISSEURS_CIBLES)]
@@ -420,3 +420,78 @@ ESSENCES_DATA = [
         "couleur": "blanc crème à jaune pâle", "couleur_hex": "#F5E6C8"
     },
 ]
+
+# Familles, dans l'ordre des sections ci-dessus
+FAMILLES = {
+    "Feuillus - bois nerveux": ("HET", "CHA"),
+    "Feuillus - chênes": ("CHE", "CHS", "CHP", "CHR"),
+    "Feuillus - frênes": ("FRE", "FRC"),
+    "Feuillus - divers": ("CHT", "MER", "NOY", "NON", "ROB"),
+    "Feuillus - érables": ("ERP", "ERC", "ERS"),
+    "Feuillus - bois blancs": ("BOU", "TRE", "PEU", "TIL", "AUN"),
+    "Feuillus - fruitiers & sorbus": ("ALT", "ALB", "COR", "ORM", "PLA", "MAR", "SAU", "POI", "POM", "PRU", "MIC"),
+    "Résineux": ("EPC", "DOU", "MEE", "PIS", "PIM", "PIN", "SAP"),
+}
+
+
+# ============================================================================
+# REGISTRE
+# ============================================================================
+# Les fiches sont rangées par colonne (un tuple par caractéristique) avec un
+# index code -> position : accès en O(1) par code, et colonnes entières pour
+# les calculs (voir calcul_epaisseurs.py). Itérer sur le registre redonne les
+# fiches sous forme de dicts, dans l'ordre ci-dessus.
+
+class RegistreEssences:
+    __slots__ = ('codes', 'familles', '_champs', '_colonnes', '_index', '_par_famille')
+
+    def __init__(self, essences: list, familles: dict):
+        famille_de = {code: nom for nom, codes in familles.items() for code in codes}
+        self.codes = tuple(e['code'] for e in essences)
+        self.familles = tuple(familles)
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self._champs = tuple(dict.fromkeys(champ for e in essences for champ in e))
+        self._colonnes = {champ: tuple(e.get(champ) for e in essences) for champ in self._champs}
+        self._colonnes['famille'] = tuple(famille_de.get(code, '') for code in self.codes)
+        self._par_famille = {nom: tuple(self._index[c] for c in codes if c in self._index)
+                             for nom, codes in familles.items()}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return str(code).upper() in self._index
+
+    def __iter__(self):
+        return (self._fiche(i) for i in range(len(self.codes)))
+
+    def _fiche(self, i: int) -> dict:
+        fiche = {champ: self._colonnes[champ][i] for champ in self._champs if self._colonnes[champ][i] is not None}
+        fiche['famille'] = self._colonnes['famille'][i]
+        return fiche
+
+    def index(self, code: str) -> int:
+        """Position de l'essence ; lève KeyError si le code est inconnu"""
+        return self._index[str(code).upper()]
+
+    def get(self, code: str, default=None):
+        i = self._index.get(str(code).upper())
+        return default if i is None else self._fiche(i)
+
+    def valeur(self, code: str, champ: str, default=None):
+        i = self._index.get(str(code).upper())
+        return default if i is None else self._colonnes[champ][i]
+
+    def colonne(self, champ: str) -> tuple:
+        """Une caractéristique pour toutes les essences, dans l'ordre de self.codes"""
+        return self._colonnes[champ]
+
+    def famille(self, code: str) -> str:
+        return self.valeur(code, 'famille', '')
+
+    def par_famille(self, famille: str) -> list:
+        return [self._fiche(i) for i in self._par_famille.get(famille, ())]
+
+
+ESSENCES = RegistreEssences(ESSENCES_DATA, FAMILLES)
+del ESSENCES_DATA  # les fiches ne vivent plus que dans le registre
@@ -4,9 +4,9 @@ Script pour importer les produits dans Simple Wood
 Exécuter avec: python3 import_produits.py
 """
 
-import requests
+import sys
 
-BASE_URL = "http://localhost:5000"
+from importer import BASE_URL, import_table
 
 PRODUITS = [
     {"code": "GRU", "nom": "Grumes"},
@@ -18,29 +18,8 @@ PRODUITS = [
 
 def import_produits():
     print(f"Import de {len(PRODUITS)} produits...")
-    
-    success = 0
-    errors = 0
-    
-    for p in PRODUITS:
-        try:
-            response = requests.post(
-                f"{BASE_URL}/api/tables/produits/values",
-                json=p,
-                timeout=10
-            )
-            result = response.json()
-            if result.get('success'):
-                print(f"  ✓ {p['code']} - {p['nom']}")
-                success += 1
-            else:
-                print(f"  ✗ {p['code']} - {result.get('message', 'Erreur')}")
-                errors += 1
-        except Exception as ex:
-            print(f"  ✗ {p['code']} - {ex}")
-            errors += 1
-    
-    print(f"\nTerminé: {success} importés, {errors} erreurs")
+    stats = import_table('produits', PRODUITS, BASE_URL)
+    return 0 if stats and not stats['erreurs'] else 1
 
 if __name__ == "__main__":
-    import_produits()
+    sys.exit(import_produits())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Import des données de référence dans Simple Wood
+Exécuter avec: python3 importer.py [essences produits epaisseurs] [--url http://...]
+
+Les lignes sont comparées au contenu actuel du serveur (empreinte des
+colonnes envoyées) : seules les lignes absentes ou différentes partent, par
+paquets, vers /api/tables/<id>/values/bulk qui les ajoute ou les met à jour
+par clé naturelle. Relancer un import déjà à jour ne fait que des lectures.
+"""
+
+import hashlib
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "http://localhost:5000"
+CHUNK_SIZE = 200
+TIMEOUT = 30
+
+
+def datasets() -> dict:
+    """Jeux de données du dépôt, par table"""
+    from essences_data import ESSENCES
+    from import_produits import PRODUITS
+    from import_epaisseurs import EPAISSEURS
+    return {
+        'essences': list(ESSENCES),
+        'produits': PRODUITS,
+        'epaisseurs': EPAISSEURS,
+    }
+
+
+def make_session() -> requests.Session:
+    """Session HTTP avec connexions réutilisées (une par table importée en parallèle)"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _cell_key(value) -> str:
+    """Forme comparable d'une cellule, comme côté serveur : '18', 18 et '18,0' se valent"""
+    text = str(value).strip()
+    try:
+        number = float(text.replace(',', '.'))
+        return str(int(number)) if number.is_integer() else str(number)
+    except ValueError:
+        return text.upper()
+
+
+def row_hash(row: dict, fields: tuple) -> str:
+    data = json.dumps([_cell_key(row.get(f, '')) for f in fields], ensure_ascii=False)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+class TableImporter:
+    def __init__(self, session: requests.Session, base_url: str, table: dict):
+        self.session = session
+        self.base_url = base_url
+        self.table = table
+        self.colonnes = [c['id'] for c in table.get('colonnes', [])]
+        self.noms = {c['id']: c['nom'] for c in table.get('colonnes', [])}
+        self._server_hashes = {}  # champs -> empreintes des lignes du serveur
+
+    def server_rows(self) -> list:
+        """Lignes du serveur, indexées par id de colonne comme les jeux de données"""
+        response = self.session.get(f"{self.base_url}/api/tables/{self.table['id']}/values", timeout=TIMEOUT)
+        response.raise_for_status()
+        return [{cid: r.get(nom, '') for cid, nom in self.noms.items()} for r in response.json()]
+
+    def pending(self, rows: list, server: list) -> list:
+        """Lignes à envoyer : celles dont l'empreinte ne se retrouve pas côté serveur"""
+        out = []
+        for row in rows:
+            fields = tuple(f for f in self.colonnes if f in row)
+            if fields not in self._server_hashes:
+                self._server_hashes[fields] = {row_hash(r, fields) for r in server}
+            if row_hash(row, fields) not in self._server_hashes[fields]:
+                out.append({f: row[f] for f in fields})
+        return out
+
+    def run(self, rows: list) -> dict:
+        debut = time.perf_counter()
+        stats = {'table': self.table['id'], 'lignes': len(rows), 'envoyees': 0,
+                 'ajoutees': 0, 'modifiees': 0, 'erreurs': 0, 'octets': 0}
+        try:
+            todo = self.pending(rows, self.server_rows())
+        except Exception as e:
+            print(f"  ✗ {self.table['id']} - lecture impossible: {e}")
+            stats['erreurs'] = len(rows)
+            todo = []
+        for i in range(0, len(todo), CHUNK_SIZE):
+            chunk = todo[i:i + CHUNK_SIZE]
+            body = json.dumps({'rows': chunk}, ensure_ascii=False).encode()
+            try:
+                response = self.session.post(f"{self.base_url}/api/tables/{self.table['id']}/values/bulk",
+                                             data=body, headers={'Content-Type': 'application/json'}, timeout=TIMEOUT)
+                result = response.json()
+            except Exception as e:
+                result = {'success': False, 'message': str(e)}
+            stats['octets'] += len(body)
+            if result.get('success'):
+                stats['envoyees'] += len(chunk)
+                stats['ajoutees'] += result.get('ajoutees', 0)
+                stats['modifiees'] += result.get('modifiees', 0)
+            else:
+                print(f"  ✗ {self.table['id']} [{i}:{i + len(chunk)}] - {result.get('message', 'Erreur')}")
+                stats['erreurs'] += len(chunk)
+        stats['duree'] = time.perf_counter() - debut
+        return stats
+
+
+def import_tables(data: dict, base_url: str = BASE_URL) -> list:
+    """Importe plusieurs tables en parallèle ; retourne les statistiques par table"""
+    session = make_session()
+    response = session.get(f"{base_url}/api/tables", timeout=TIMEOUT)
+    response.raise_for_status()
+    tables = {t['id']: t for t in response.json()}
+    missing = [tid for tid in data if tid not in tables]
+    for tid in missing:
+        print(f"  ✗ {tid} - table inconnue du serveur")
+    importers = [(TableImporter(session, base_url, tables[tid]), rows) for tid, rows in data.items() if tid in tables]
+    with ThreadPoolExecutor(max_workers=max(len(importers), 1)) as pool:
+        return list(pool.map(lambda job: job[0].run(job[1]), importers))
+
+
+def import_table(table_id: str, rows: list, base_url: str = BASE_URL) -> dict:
+    stats = import_tables({table_id: rows}, base_url)
+    report(stats)
+    return stats[0] if stats else {}
+
+
+def report(stats: list, duree: float = None):
+    for s in stats:
+        print(f"  ✓ {s['table']}: {s['lignes']} lignes, {s['envoyees']} envoyées "
+              f"({s['ajoutees']} ajoutées, {s['modifiees']} modifiées), {s['erreurs']} erreurs, "
+              f"{s['duree'] * 1000:.0f} ms")
+    if duree is not None:
+        total = sum(s['lignes'] for s in stats)
+        octets = sum(s['octets'] for s in stats)
+        print(f"\nTerminé: {total} lignes en {duree:.2f} s ({total / duree if duree else 0:.0f} lignes/s, "
+              f"{octets / 1024:.1f} Ko envoyés)")
+
+
+def main(argv: list = None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    base_url = BASE_URL
+    if '--url' in argv:
+        i = argv.index('--url')
+        base_url = argv[i + 1].rstrip('/')
+        del argv[i:i + 2]
+    data = datasets()
+    if argv:
+        data = {tid: rows for tid, rows in data.items() if tid in argv}
+    print(f"Import de {', '.join(data)} vers {base_url}...")
+    debut = time.perf_counter()
+    stats = import_tables(data, base_url)
+    report(stats, time.perf_counter() - debut)
+    return 0 if not any(s['erreurs'] for s in stats) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
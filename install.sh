@@ -28,7 +28,7 @@ fi
 
 echo "→ Installation dépendances..."
 source venv/bin/activate
-pip install --quiet flask gspread google-auth
+pip install --quiet flask gspread google-auth numpy
 
 # Vérifier credentials.json
 if [ ! -f "$DIR/credentials.json" ]; then